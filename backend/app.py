@@ -1,21 +1,25 @@
-import requests
+import asyncio
+import os
+
 import uvicorn
+from config.settings import settings
+from core.chat_store import chat_store
+from core.conversation_memory import conversation_memory
+from core.finetune import finetune_jobs
+from core.metrics import registry
+from core.model_manager import model_manager
+from core.network_stats import network_stats
+from core.retriever import retriever
+from core.tensorlink_manager import tensorlink_manager
+from core.warmup import warmup
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from routers import chat, model, tensorlink
+from fastapi.responses import PlainTextResponse
+from routers import admin, chat, chats, finetune, model, tensorlink
 
 https_serv = "https://smartnodes.ddns.net/tensorlink-api"
 http_serv = "http://smartnodes.ddns.net/tensorlink-api"
 
-# Mock database for storing fine-tuning status
-fine_tuning_jobs = {}
-
-tensorlink_status = {
-    "connected": False,
-    "node": None,
-    "api_key": None
-}
-
 app = FastAPI(
     title="localhostGPT Backend"
 )
@@ -29,31 +33,62 @@ app.add_middleware(
 )
 
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(chats.router, prefix="/api", tags=["chats"])
 app.include_router(model.router, prefix="/api", tags=["models"])
 app.include_router(tensorlink.router, prefix="/api", tags=["tensorlink"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
+app.include_router(finetune.router, prefix="/api", tags=["finetune"])
+
+# Heavy dependencies are imported lazily; load them in the background after startup
+warmup.register("index", retriever.load_index)
+warmup.register("retriever", retriever.warm)
+warmup.register("tokenizer", lambda: conversation_memory.encoding)
+warmup.register("models", lambda: model_manager.preload(wait=True))
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start background warmup and network stats polling without blocking startup."""
+    # With several workers, the first to take the index writer lock owns the
+    # chat import, index updates, fine-tuning jobs and resetting shared state from the last run
+    if retriever.index.try_acquire_writer():
+        tensorlink_manager.reset()
+        warmup.register("chat_store", chat_store.import_json_dir)
+        warmup.register("index_sync", retriever.update_index)
+        asyncio.create_task(retriever.run_index_updates())
+        asyncio.create_task(finetune_jobs.run())
+
+    warmup.start()
+    network_stats.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await network_stats.stop()
 
 
 @app.get("/api/status")
 async def get_status():
-    if tensorlink_status["node"] is None:
-        return {"success": False, "message": "Could not get network status.", "connected": False}
+    worker = {"pid": os.getpid(), "index_writer": retriever.index.is_writer}
+    if not tensorlink_manager.status.get("connected"):
+        return {"success": False, "message": "Could not get network status.", "connected": False, "worker": worker, **warmup.status()}
     else:
-        return {"success": True, "message": "Connected to Tensorlink.", "connected": True}
+        return {"success": True, "message": "Connected to Tensorlink.", "connected": True, "worker": worker, **warmup.status()}
     
 @app.get("/api/stats")
 async def get_network_stats():
-    try:
-        response = requests.get(f"{https_serv}/stats")
-        try:
-            data = response.json()
-            print(data)
-        except ValueError:
-            data = response.text
+    """Last known Tensorlink stats with their age; refreshed in the background."""
+    return network_stats.snapshot()
 
-        return {"status_code": response.status_code, "data": data}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Pipeline latency histograms and counters in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=5053)
+    if settings.WORKERS > 1:
+        # Workers are separate processes, so uvicorn needs the import string
+        uvicorn.run("app:app", host="127.0.0.1", port=5053, workers=settings.WORKERS)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=5053)
@@ -0,0 +1,120 @@
+"""
+LoRA fine-tuning end to end on CPU with a tiny model.
+
+Imports a synthetic chat corpus into a fresh chat store, submits a job and
+runs the job runner until it finishes, reporting training throughput. With
+--interrupt-at the training process is killed after that many steps and the
+runner restarted, the way a server restart would, to check the job resumes
+from its checkpoint instead of starting over. Finally the adapter is loaded
+through the model manager and asked for a reply.
+
+    cd backend && python -m benchmarks.bench_finetune --model sshleifer/tiny-gpt2 --steps 40 --interrupt-at 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.run_benchmarks import git_revision
+
+
+async def run_until(jobs, job_id: str, done, timeout: float) -> dict:
+    """Drive the job runner until done(job) holds."""
+    runner = asyncio.create_task(jobs.run())
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            job = jobs.get(job_id)
+            if done(job):
+                return job
+            await asyncio.sleep(0.2)
+        raise TimeoutError(f"Job {job_id} still {jobs.get(job_id)['status']} after {timeout}s")
+    finally:
+        runner.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--checkpoint-steps", type=int, default=10)
+    parser.add_argument("--interrupt-at", type=int, default=0, help="Kill training after this many steps, then resume")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write results JSON here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="localhostgpt-finetune-")
+    chat_dir = os.path.join(workdir, "chats")
+
+    # Settings are read at import time, and by the training process, so set them in the environment
+    os.environ.update({
+        "CHAT_DIR": chat_dir,
+        "CHAT_DB_PATH": os.path.join(workdir, "chat_store.db"),
+        "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+        "INDEX_DIR": os.path.join(workdir, "index"),
+        "FINETUNE_DIR": os.path.join(workdir, "finetune"),
+        "FINETUNE_MAX_STEPS": str(args.steps),
+        "FINETUNE_BATCH_SIZE": str(args.batch_size),
+        "FINETUNE_THREADS": str(args.threads),
+        "FINETUNE_CHECKPOINT_STEPS": str(args.checkpoint_steps),
+        "FINETUNE_POLL_SECONDS": "0.2",
+        "FINETUNE_HOT_LOAD": "false",
+        "DEFAULT_DTYPE": "float32"
+    })
+
+    generate_corpus(chat_dir, args.chats)
+
+    from core.chat_store import chat_store
+    from core.finetune import FinetuneJobs
+    from core.model_manager import model_manager
+    from routers.model import chat_with_model
+
+    chat_store.import_json_dir(chat_dir)
+
+    jobs = FinetuneJobs()
+    job = jobs.submit(args.model, [])
+    results = {"revision": git_revision(), "python": sys.version.split()[0], "config": vars(args), "job_id": job["id"]}
+    start = time.perf_counter()
+
+    if args.interrupt_at:
+        asyncio.run(run_until(jobs, job["id"], lambda job: job.get("checkpoint_step", 0) >= args.interrupt_at or job["status"] not in ("queued", "running"), args.timeout))
+        interrupted = jobs.get(job["id"])
+        if jobs._process is not None:
+            jobs._process.kill()
+            jobs._process.join()
+        results["interrupted"] = {"step": interrupted["step"], "checkpoint_step": interrupted.get("checkpoint_step")}
+        print(f"Killed training at step {interrupted['step']}, restarting the runner", file=sys.stderr)
+        # A fresh runner, as after a server restart
+        jobs = FinetuneJobs()
+
+    job = asyncio.run(run_until(jobs, job["id"], lambda job: job["status"] in ("completed", "failed", "cancelled"), args.timeout))
+    results["seconds"] = round(time.perf_counter() - start, 3)
+    results["job"] = job
+
+    if job["status"] == "completed":
+        model_manager.register_adapter(job["adapter_name"], job["model"], job["adapter_path"])
+        load_start = time.perf_counter()
+        with model_manager.lease(job["adapter_name"]) as (tokenizer, model):
+            results["adapter_load_seconds"] = round(time.perf_counter() - load_start, 3)
+            results["sample_reply"] = chat_with_model(model, tokenizer, "Can you help me with a sourdough starter?", max_new_tokens=16)
+
+    output = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if job["status"] != "completed":
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Startup time, memory and output parity of the local model load modes.
+
+Each mode is loaded in a fresh subprocess so peak RSS isn't shared between
+runs. Perplexity over a small fixture and top-1 token agreement with float32
+show how much each mode drifts from the unquantized model.
+
+    cd backend && python -m benchmarks.bench_model_loading --model sshleifer/tiny-gpt2 --modes float32 bfloat16 int8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "parity.txt")
+
+
+def peak_rss_mb():
+    """This process's peak resident set size in MB, or None where it can't be read (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(model_name: str, mode: str):
+    """Load one mode, evaluate it on the fixture and print a JSON line."""
+    import torch
+    from core.model_manager import ModelManager, load_causal_lm
+    from transformers import AutoTokenizer
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = load_causal_lm(model_name, mode, "cpu")
+    load_seconds = time.perf_counter() - start
+    rss_after = peak_rss_mb()
+
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        input_ids = tokenizer.encode(f.read(), return_tensors="pt")
+
+    with torch.no_grad():
+        start = time.perf_counter()
+        outputs = model(input_ids, labels=input_ids)
+        forward_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": mode,
+        "load_seconds": round(load_seconds, 3),
+        "peak_rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+        "weights_mb": round(ModelManager._estimate_memory(model) / 1024 ** 2, 1),
+        "forward_ms": round(forward_seconds * 1000, 2),
+        "perplexity": round(float(torch.exp(outputs.loss.float())), 4),
+        "top1": outputs.logits[0].float().argmax(-1).tolist()
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--modes", nargs="+", default=["float32", "bfloat16", "int8"])
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.model, args.child)
+        return
+
+    results = []
+    for mode in dict.fromkeys(["float32", *args.modes]):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_model_loading", "--model", args.model, "--child", mode],
+            capture_output=True, text=True, check=True
+        )
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    reference = results[0]
+    reference_top1 = reference["top1"]
+    for result in results:
+        top1 = result.pop("top1")
+        result["top1_agreement"] = round(sum(a == b for a, b in zip(top1, reference_top1)) / len(top1), 4)
+        result["perplexity_delta"] = round(result["perplexity"] - reference["perplexity"], 4)
+
+    if args.json:
+        print(json.dumps({"model": args.model, "modes": results}))
+        return
+
+    print(f"{'mode':<9} {'load s':>7} {'rss MB':>7} {'weights MB':>11} {'fwd ms':>8} {'ppl':>9} {'ppl delta':>10} {'top1 agree':>11}")
+    for r in results:
+        rss = "n/a" if r["peak_rss_delta_mb"] is None else f"{r['peak_rss_delta_mb']:.1f}"
+        print(f"{r['mode']:<9} {r['load_seconds']:>7.2f} {rss:>7} {r['weights_mb']:>11.1f} "
+              f"{r['forward_ms']:>8.2f} {r['perplexity']:>9.3f} {r['perplexity_delta']:>10.3f} {r['top1_agreement']:>11.2%}")
+
+
+if __name__ == "__main__":
+    main()
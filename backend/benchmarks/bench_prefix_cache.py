@@ -0,0 +1,86 @@
+"""
+Prefill time saved by the per-conversation prefix cache.
+
+Runs the same multi-turn conversation through a small local model twice per
+turn: once through an empty cache, re-encoding the whole history, and once
+resuming from the cached prefix of the previous turn. Both go through
+PrefixCache.generate and are timed the same way, once each, so the only
+difference is the reused prefix. Only one token is generated, so the timings
+are dominated by prefill.
+
+    cd backend && python -m benchmarks.bench_prefix_cache --model sshleifer/tiny-gpt2 --turns 8
+"""
+import argparse
+import json
+import time
+
+import torch
+from core.prefix_cache import PrefixCache
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+USER_TURN = "Can you explain how peer-to-peer inference splits a model across nodes? " * 3
+ASSISTANT_TURN = "The model is partitioned into stages and each node runs a contiguous block of layers. " * 4
+
+
+def time_generate(fn) -> float:
+    start = time.perf_counter()
+    with torch.no_grad():
+        fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model).eval()
+    cache = PrefixCache(spill_dir="")
+    generate_kwargs = {"max_new_tokens": 1, "do_sample": False, "pad_token_id": tokenizer.eos_token_id}
+
+    # Warm up so neither path pays for first-call allocations
+    time_generate(lambda: PrefixCache(spill_dir="").generate(model, tokenizer.encode(USER_TURN, return_tensors="pt"), "warmup", args.model, **generate_kwargs))
+
+    history = ""
+    results = []
+    for turn in range(args.turns):
+        history += USER_TURN + tokenizer.eos_token
+        input_ids = tokenizer.encode(history, return_tensors="pt")
+
+        full_ms = time_generate(lambda: PrefixCache(spill_dir="").generate(model, input_ids, "bench", args.model, **generate_kwargs))
+
+        reused = 0
+
+        def cached():
+            nonlocal reused
+            _, reused = cache.generate(model, input_ids, "bench", args.model, **generate_kwargs)
+
+        cached_ms = time_generate(cached)
+
+        results.append({
+            "turn": turn + 1,
+            "prompt_tokens": input_ids.shape[1],
+            "reused_tokens": reused,
+            "full_prefill_ms": round(full_ms, 2),
+            "cached_prefill_ms": round(cached_ms, 2),
+            "saved_ms": round(full_ms - cached_ms, 2)
+        })
+
+        history += ASSISTANT_TURN + tokenizer.eos_token
+
+    if args.json:
+        print(json.dumps({"model": args.model, "turns": results}))
+        return
+
+    print(f"{'turn':>4} {'prompt':>7} {'reused':>7} {'full ms':>9} {'cached ms':>10} {'saved ms':>9}")
+    for r in results:
+        print(f"{r['turn']:>4} {r['prompt_tokens']:>7} {r['reused_tokens']:>7} "
+              f"{r['full_prefill_ms']:>9.2f} {r['cached_prefill_ms']:>10.2f} {r['saved_ms']:>9.2f}")
+    print(f"Total prefill saved: {sum(r['saved_ms'] for r in results):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
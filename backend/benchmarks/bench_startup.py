@@ -0,0 +1,101 @@
+"""
+Import time of the backend entry point.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, reports
+the total and the slowest imports by cumulative time, and fails if startup
+exceeds a budget or if any heavy dependency is imported eagerly. Those are
+meant to load in the background warmup, after the server is accepting
+requests.
+
+    cd backend && python -m benchmarks.bench_startup --max-ms 1500
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+# Top-level packages that must not be imported until warmup or first use
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "huggingface_hub",
+    "sentence_transformers",
+    "langchain",
+    "langchain_community",
+    "chromadb",
+    "tensorlink",
+    "requests_html",
+    "numpy",
+    "bs4"
+]
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Entries of `-X importtime` output as {module, self_us, cumulative_us, depth}."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip())) // 2
+        })
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if importing app takes longer than this")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="Write results JSON here instead of stdout")
+    args = parser.parse_args()
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        sys.exit(proc.returncode)
+
+    entries = parse_importtime(proc.stderr)
+    app_entry = next((e for e in entries if e["module"] == "app"), None)
+    total_ms = (app_entry["cumulative_us"] if app_entry else sum(e["self_us"] for e in entries)) / 1000
+
+    imported = {e["module"].split(".")[0] for e in entries}
+    eager_heavy = [module for module in HEAVY_MODULES if module in imported]
+
+    results = {
+        "total_ms": round(total_ms, 1),
+        "modules": len(entries),
+        "eager_heavy_imports": eager_heavy,
+        "slowest": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 1), "self_ms": round(e["self_us"] / 1000, 1)}
+            for e in sorted(entries, key=lambda e: -e["cumulative_us"])[:args.top]
+        ]
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    failures = []
+    if eager_heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager_heavy)}")
+    if args.max_ms is not None and total_ms > args.max_ms:
+        failures.append(f"import took {total_ms:.0f}ms, budget is {args.max_ms:.0f}ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+/api/chat throughput as the number of uvicorn worker processes grows.
+
+Builds a synthetic corpus and its index once in this process, then gives up
+the index writer lock so one of the backend's workers takes it, as in
+production, and finds the index already current. Then it starts the backend
+with 1, 2, 4... workers against local
+Tensorlink and DuckDuckGo stand-ins and reports throughput and its speedup
+over a single worker. Embedding the query and searching the index are the
+CPU-bound part being spread across cores.
+
+    cd backend && python -m benchmarks.bench_workers --workers 1 2 4 --concurrency 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+from benchmarks.corpus import generate_corpus, sample_queries
+from benchmarks.run_benchmarks import bench_chat_throughput, free_port, git_revision
+from benchmarks.stand_ins import FakeTensorlinkServer, FakeWebServer
+
+
+def wait_until_ready(port: int, process: subprocess.Popen, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/status", timeout=2).json().get("ready"):
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError("Backend did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in Tensorlink latency in seconds")
+    parser.add_argument("--output", help="Write results JSON here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="localhostgpt-workers-")
+    chat_dir = os.path.join(workdir, "chats")
+
+    with FakeTensorlinkServer(args.latency, 0.0, web_search=False) as tensorlink, FakeWebServer() as web:
+        env = {
+            "TENSORLINK_HTTPS_SERVER": tensorlink.url,
+            "TENSORLINK_HTTP_SERVER": tensorlink.url,
+            "TENSORLINK_HEDGE_SERVERS": "[]",
+            "WEB_SEARCH_URL": web.search_url,
+            "CHAT_DIR": chat_dir,
+            "CHAT_DB_PATH": os.path.join(workdir, "chat_store.db"),
+            "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+            "INDEX_DIR": os.path.join(workdir, "index"),
+            # Each worker would otherwise get the full default concurrency
+            "SCHEDULER_MAX_QUEUE": str(args.requests)
+        }
+        os.environ.update(env)
+
+        generate_corpus(chat_dir, args.chats, 12, 12)
+
+        from core.chat_store import chat_store
+        from core.retriever import retriever
+
+        chat_store.import_json_dir(chat_dir)
+        retriever.index.try_acquire_writer()
+        start = time.perf_counter()
+        retriever.build_index()
+        index_seconds = time.perf_counter() - start
+        retriever.index.release_writer()
+
+        queries = sample_queries(args.queries)
+        results = {
+            "revision": git_revision(),
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "index_build_seconds": round(index_seconds, 3),
+            "levels": []
+        }
+
+        for workers in args.workers:
+            port = free_port()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                env={**os.environ, **env}
+            )
+            try:
+                wait_until_ready(port, process)
+                # Let every worker load its embedding model and map the index before measuring
+                bench_chat_throughput(port, queries, args.concurrency, workers * args.concurrency)
+                level = bench_chat_throughput(port, queries, args.concurrency, args.requests)
+            finally:
+                process.terminate()
+                process.wait()
+
+            level["workers"] = workers
+            results["levels"].append(level)
+            print(f"workers={workers}: {level['throughput_rps']} req/s", file=sys.stderr)
+
+        baseline = results["levels"][0]["throughput_rps"] if results["levels"] else 0
+        for level in results["levels"]:
+            level["speedup"] = round(level["throughput_rps"] / baseline, 2) if baseline else None
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
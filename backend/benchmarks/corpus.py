@@ -0,0 +1,84 @@
+"""
+Synthetic chat history in the format the renderer writes to ~/localhostGPT.
+
+Each chat is a JSON array of {role, content, timestamp} messages, with
+millisecond timestamps spread over the requested number of months.
+"""
+import json
+import os
+import random
+import time
+from typing import Dict, List
+
+TOPICS = {
+    "travel": ["flights to Lisbon", "a rail pass for Japan", "packing for a week of hiking", "visa rules for Canada"],
+    "cooking": ["a sourdough starter", "weeknight curry", "meal prep for the week", "substituting buttermilk"],
+    "programming": ["a FastAPI router", "Python asyncio timeouts", "a React hook that polls", "SQLite WAL mode"],
+    "fitness": ["a beginner running plan", "stretching after lifting", "protein on rest days", "a 5k pace chart"],
+    "finance": ["an emergency fund", "index fund fees", "splitting rent fairly", "tracking subscriptions"],
+    "ml": ["LoRA fine-tuning", "quantizing a 7B model", "speculative decoding", "embedding models for search"]
+}
+
+USER_TEMPLATES = [
+    "Can you help me with {subject}?",
+    "I'm still thinking about {subject}. What would you change?",
+    "Remember what we said about {subject}? I need the details again.",
+    "Give me a short checklist for {subject}.",
+    "What are the common mistakes with {subject}?"
+]
+
+ASSISTANT_TEMPLATES = [
+    "For {subject}, start by writing down what you need and the constraints you have. {filler}",
+    "The main thing with {subject} is to keep it simple at first and iterate. {filler}",
+    "Here is what usually works for {subject}: pick one approach, measure it, then adjust. {filler}",
+    "People often overcomplicate {subject}. Focus on the basics and the rest follows. {filler}"
+]
+
+FILLER = [
+    "It also helps to keep notes so you can compare later.",
+    "If something feels off, revisit the assumptions before changing everything.",
+    "Small, regular steps beat occasional big pushes.",
+    "Check the defaults first; they are right more often than you'd expect."
+]
+
+
+def make_chat(rng: random.Random, messages: int, start_ms: int, span_ms: int) -> List[Dict]:
+    topic = rng.choice(list(TOPICS))
+    subject = rng.choice(TOPICS[topic])
+    timestamp = start_ms + rng.randrange(max(span_ms, 1))
+
+    chat = []
+    for i in range(messages):
+        if i % 2 == 0:
+            content = rng.choice(USER_TEMPLATES).format(subject=subject)
+            role = "user"
+        else:
+            filler = " ".join(rng.sample(FILLER, rng.randint(1, len(FILLER))))
+            content = rng.choice(ASSISTANT_TEMPLATES).format(subject=subject, filler=filler)
+            role = "assistant"
+        timestamp += rng.randint(5_000, 600_000)
+        chat.append({"role": role, "content": content, "timestamp": timestamp})
+    return chat
+
+
+def generate_corpus(directory: str, chats: int = 200, messages_per_chat: int = 12, months: int = 12, seed: int = 0) -> List[str]:
+    """Write chats to directory and return the conversation ids."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    span_ms = months * 30 * 24 * 3600 * 1000
+    start_ms = int(time.time() * 1000) - span_ms
+
+    ids = []
+    for i in range(chats):
+        conversation_id = f"chat-{i:05d}"
+        with open(os.path.join(directory, f"{conversation_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(make_chat(rng, messages_per_chat, start_ms, span_ms), f)
+        ids.append(conversation_id)
+    return ids
+
+
+def sample_queries(count: int, seed: int = 1) -> List[str]:
+    """Queries that reference the generated topics."""
+    rng = random.Random(seed)
+    subjects = [subject for subjects in TOPICS.values() for subject in subjects]
+    return [rng.choice(USER_TEMPLATES).format(subject=rng.choice(subjects)) for _ in range(count)]
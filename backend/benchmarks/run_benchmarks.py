@@ -0,0 +1,188 @@
+"""
+Offline end-to-end benchmark of the retrieval and chat pipeline.
+
+Generates a synthetic chat corpus, points the backend at local stand-ins for
+Tensorlink and DuckDuckGo, then measures index build time, history search
+latency, prompt generation latency and /api/chat throughput at several
+concurrency levels. Results are written as JSON for regression tracking.
+
+    cd backend && python -m benchmarks.run_benchmarks --chats 500 --concurrency 1 4 16 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+import requests
+from benchmarks.corpus import generate_corpus, sample_queries
+from benchmarks.stand_ins import FakeTensorlinkServer, FakeWebServer
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(np.mean(samples)) * 1000, 3),
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 3)
+    }
+
+
+def timed(fn: Callable, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_chat_throughput(port: int, queries: List[str], concurrency: int, requests_per_level: int) -> Dict:
+    url = f"http://127.0.0.1:{port}/api/chat"
+
+    def send(i: int):
+        body = {
+            "message": queries[i % len(queries)],
+            "settings": {"modelName": "Qwen/Qwen2.5-7B-Instruct", "temperature": 0.7, "maxTokens": 64, "isTensorlinkConnected": True},
+            "conversationId": f"bench-{i % max(concurrency, 1)}"
+        }
+        start = time.perf_counter()
+        response = requests.post(url, json=body, timeout=300)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, range(requests_per_level)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, status in outcomes if status == 200]
+    statuses: Dict[str, int] = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests_per_level,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+        "statuses": statuses,
+        "latency": latency_summary(latencies) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages-per-chat", type=int, default=12)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-level", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in Tensorlink latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Extra random Tensorlink latency in seconds")
+    parser.add_argument("--no-web", action="store_true", help="Have the stand-in classifier skip web search")
+    parser.add_argument("--output", help="Write results JSON here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="localhostgpt-bench-")
+    chat_dir = os.path.join(workdir, "chats")
+
+    with FakeTensorlinkServer(args.latency, args.jitter, web_search=not args.no_web) as tensorlink, FakeWebServer() as web:
+        # Settings are read at import time, so configure before importing the backend
+        os.environ.update({
+            "TENSORLINK_HTTPS_SERVER": tensorlink.url,
+            "TENSORLINK_HTTP_SERVER": tensorlink.url,
+            "TENSORLINK_HEDGE_SERVERS": "[]",
+            "WEB_SEARCH_URL": web.search_url,
+            "CHAT_DIR": chat_dir,
+            "CHAT_DB_PATH": os.path.join(workdir, "chat_store.db"),
+            "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+            "INDEX_DIR": os.path.join(workdir, "index")
+        })
+
+        results = {
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": vars(args)
+        }
+
+        corpus_seconds = timed(generate_corpus, chat_dir, args.chats, args.messages_per_chat, args.months)
+        results["corpus"] = {"chats": args.chats, "messages": args.chats * args.messages_per_chat, "seconds": round(corpus_seconds, 3)}
+
+        import uvicorn
+        from app import app
+        from core.chat_store import chat_store
+        from core.retriever import retriever
+
+        queries = sample_queries(args.queries)
+
+        results["import_seconds"] = round(timed(chat_store.import_json_dir, chat_dir), 3)
+
+        retriever.index.try_acquire_writer()
+        results["index_build_seconds"] = round(timed(retriever.build_index), 3)
+        print(f"Index built in {results['index_build_seconds']}s", file=sys.stderr)
+
+        results["search_relevant_history"] = latency_summary(
+            [timed(retriever.search_relevant_history, query, 5) for query in queries]
+        )
+
+        async def prompt_latencies():
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                await retriever.generate_intelligent_prompt(query)
+                samples.append(time.perf_counter() - start)
+            return samples
+
+        results["generate_intelligent_prompt"] = latency_summary(asyncio.run(prompt_latencies()))
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        try:
+            results["chat"] = []
+            for concurrency in args.concurrency:
+                level = bench_chat_throughput(port, queries, concurrency, args.requests_per_level)
+                print(f"/api/chat concurrency={concurrency}: {level['throughput_rps']} req/s", file=sys.stderr)
+                results["chat"].append(level)
+        finally:
+            server.should_exit = True
+            thread.join()
+
+        results["tensorlink_requests"] = tensorlink.requests
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
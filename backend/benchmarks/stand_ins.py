@@ -0,0 +1,151 @@
+"""
+Local stand-ins for the services the backend calls out to.
+
+FakeTensorlinkServer answers /generate and /stats like the Tensorlink API,
+with an injectable delay. FakeWebServer serves a DuckDuckGo-style HTML results
+page and the article pages it links to, so the web search path runs without
+network access.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_PARAGRAPHS = [
+    "Peer-to-peer inference splits a model into stages so that each node only holds part of the weights.",
+    "Latency is dominated by the slowest node in the pipeline and the bandwidth between neighbouring stages.",
+    "Caching activations for repeated prefixes avoids recomputing attention over the whole conversation.",
+    "Quantizing linear layers to eight bits roughly quarters their memory compared with float32.",
+    "Retrieval augmented generation adds relevant passages to the prompt before the model answers.",
+    "Hedged requests trade a little extra load for much lower tail latency on variable backends."
+]
+
+
+class _Server:
+    """Runs a ThreadingHTTPServer on a free local port in a daemon thread."""
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        handler = type("Handler", (self.handler_class,), {"server_state": self, "log_message": lambda *args: None})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _TensorlinkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urlparse(self.path).path.endswith("/stats"):
+            self._send_json(200, {
+                "nodes": {"workers": 12, "validators": 3, "users": 40},
+                "models": [
+                    {"id": "Qwen/Qwen2.5-7B-Instruct", "name": "Qwen2.5-7B"},
+                    {"id": "Qwen/Qwen3-8B-Instruct", "name": "Qwen3-8B"}
+                ]
+            })
+        else:
+            self._send_json(404, {"detail": "Not found"})
+
+    def do_POST(self):
+        if not urlparse(self.path).path.endswith("/generate"):
+            self._send_json(404, {"detail": "Not found"})
+            return
+
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.server_state.next_request())
+
+        message = payload.get("message", "")
+        if "needs_web_search" in message:
+            # Classification prompt: ask for both sources so the whole pipeline runs
+            text = json.dumps({"needs_web_search": self.server_state.web_search, "needs_chat_history": True})
+        else:
+            text = "Stand-in answer. " * max(1, min(payload.get("max_new_tokens", 32), 256) // 4)
+        self._send_json(200, {"response": text})
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeTensorlinkServer(_Server):
+    """
+    Stand-in Tensorlink API.
+
+    Each /generate call sleeps latency seconds, plus up to jitter more, so tail
+    latency behaviour can be reproduced.
+    """
+    handler_class = _TensorlinkHandler
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, web_search: bool = True, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.web_search = web_search
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_request(self) -> float:
+        """Count a /generate call and return how long it should take. Handlers run on their own threads."""
+        with self._lock:
+            self.requests += 1
+            return self.latency + self._random.random() * self.jitter
+
+
+class _WebHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+
+        if parsed.path.startswith("/html"):
+            query = parse_qs(parsed.query).get("q", [""])[0]
+            results = "".join(
+                f'<div class="result"><a class="result__a" href="{self.server_state.url}/page/{i}">Result {i} for {query}</a>'
+                f"<span>{PAGE_PARAGRAPHS[i % len(PAGE_PARAGRAPHS)]}</span></div>"
+                for i in range(self.server_state.results)
+            )
+            self._send_html(f"<html><body>{results}</body></html>")
+        elif parsed.path.startswith("/page/"):
+            index = int(parsed.path.rsplit("/", 1)[-1])
+            paragraphs = "".join(f"<p>{PAGE_PARAGRAPHS[(index + i) % len(PAGE_PARAGRAPHS)]}</p>" for i in range(12))
+            self._send_html(f"<html><body><article><h1>Page {index}</h1>{paragraphs}</article></body></html>")
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def _send_html(self, html: str):
+        data = html.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeWebServer(_Server):
+    """Stand-in for DuckDuckGo's HTML endpoint and the pages it links to."""
+    handler_class = _WebHandler
+
+    def __init__(self, results: int = 5):
+        super().__init__()
+        self.results = results
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.url}/html/"
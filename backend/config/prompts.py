@@ -22,3 +22,14 @@ def contextualize_prompt(context: str, query: str) -> str:
 Answer the user query using your knowledge and the relevant context below.
 RELEVANT CONTEXT: {context}
 USER QUERY: {query}"""
+
+
+def summarize_prompt(summary: str, transcript: str, max_words: int) -> str:
+    """Prompt for folding older turns into the rolling conversation summary."""
+    return f"""
+Update the running summary of a conversation with the new messages below. Keep facts, names,
+decisions and open questions; drop pleasantries. Respond with the updated summary only, in at
+most {max_words} words.
+CURRENT SUMMARY: {summary or "(empty)"}
+NEW MESSAGES:
+{transcript}"""
@@ -1,4 +1,5 @@
-from typing import List
+import os
+from typing import Dict, List
 
 from pydantic_settings import BaseSettings
 
@@ -11,9 +12,116 @@ class Settings(BaseSettings):
 
     TENSORLINK_HTTPS_SERVER: str = "https://smartnodes.ddns.net/tensorlink-api"
     TENSORLINK_HTTP_SERVER: str = "http://smartnodes.ddns.net/tensorlink-api"
+    TENSORLINK_HEDGE_SERVERS: List[str] = ["http://smartnodes.ddns.net/tensorlink-api"]
+
+    STATS_REFRESH_SECONDS: float = 30.0
+    STATS_STALE_SECONDS: float = 60.0
+    STATS_TIMEOUT_SECONDS: float = 10.0
+
+    CHAT_DEADLINE_SECONDS: float = 120.0
+    CLASSIFICATION_TIMEOUT_SECONDS: float = 15.0
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 10.0
+    MAX_HEDGES: int = 1
+
+    SCHEDULER_MAX_CONCURRENCY: int = 4
+    SCHEDULER_MAX_QUEUE: int = 32
+    SCHEDULER_MAX_PER_CLIENT: int = 8
     
+    # Admin-only sampling profiler at /api/admin/profile
+    PROFILING_ENABLED: bool = False
+    PROFILING_MAX_SECONDS: float = 300.0
+    ADMIN_TOKEN: str = ""
+
+    CHAT_DIR: str = os.path.join(os.path.expanduser("~"), "localhostGPT")
+    # SQLite chat store; the renderer's JSON files in CHAT_DIR are imported on first start
+    CHAT_DB_PATH: str = os.path.join(os.path.expanduser("~"), "localhostGPT", "chat_store.db")
+    # State shared by all worker processes (connection status, job tables)
+    SHARED_STATE_PATH: str = os.path.join(os.path.expanduser("~"), "localhostGPT", "shared_state.db")
+    # Memory-mapped vector index; one worker owns updates, all workers read it
+    INDEX_DIR: str = os.path.join(os.path.expanduser("~"), "localhostGPT", "index")
+    INDEX_REFRESH_SECONDS: float = 5.0
+    # Superseded index versions stay on disk this long, for readers still searching them
+    INDEX_VERSION_GRACE_SECONDS: float = 300.0
+    # Changing any of these makes the index rebuild from scratch
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    CHUNK_SIZE: int = 500
+    CHUNK_OVERLAP: int = 50
+    # The index is sharded by month; months older than this merge into yearly shards
+    INDEX_COMPACT_AFTER_MONTHS: int = 12
+    INDEX_SEARCH_THREADS: int = 4
+    # Halve a chat result's score for every this many days of age; 0 ranks by similarity alone
+    RETRIEVAL_RECENCY_HALF_LIFE_DAYS: float = 0.0
+    # Context packing: chat chunks considered, relevance vs. diversity (1 = relevance only),
+    # and the SimHash distance in bits under which two chunks count as duplicates
+    CONTEXT_CHAT_CANDIDATES: int = 10
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    CONTEXT_DUPLICATE_BITS: int = 3
+    # Web pages are split into passages and only the best ones, up to this many tokens, are considered
+    WEB_PASSAGE_TOKENS: int = 120
+    WEB_CONTEXT_MAX_TOKENS: int = 1000
+    WEB_PASSAGE_CACHE_PAGES: int = 256
+    WEB_PAGE_MAX_CHARS: int = 20000
+    # Drafts prefetched while typing: how long prepared context is kept, how many
+    # drafts are cached and warmed at once, and how close a sent message must be to reuse one
+    PREFETCH_TTL_SECONDS: float = 30.0
+    PREFETCH_MAX_ENTRIES: int = 32
+    PREFETCH_MAX_INFLIGHT: int = 2
+    PREFETCH_MIN_CHARS: int = 12
+    PREFETCH_MATCH_RATIO: float = 0.9
+    # Whether drafts may run web search at all; clients can turn it off, not on
+    PREFETCH_WEB: bool = False
+    # Batch chat: items per request, and how many generate at once
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_DEFAULT_CONCURRENCY: int = 2
+    BATCH_MAX_CONCURRENCY: int = 4
+    BATCH_QUEUE_RETRIES: int = 3
+    # LoRA fine-tuning runs one job at a time in its own process, limited to FINETUNE_THREADS
+    # CPU threads; it checkpoints every FINETUNE_CHECKPOINT_STEPS steps so jobs can resume
+    FINETUNE_DIR: str = os.path.join(os.path.expanduser("~"), "localhostGPT", "finetune")
+    FINETUNE_THREADS: int = 2
+    FINETUNE_EPOCHS: int = 1
+    # 0 trains for FINETUNE_EPOCHS full passes
+    FINETUNE_MAX_STEPS: int = 0
+    FINETUNE_BATCH_SIZE: int = 4
+    FINETUNE_MAX_LENGTH: int = 512
+    FINETUNE_LEARNING_RATE: float = 2e-4
+    FINETUNE_LORA_RANK: int = 8
+    FINETUNE_LORA_ALPHA: int = 16
+    FINETUNE_LORA_DROPOUT: float = 0.05
+    # Empty lets peft pick the attention projections for known architectures
+    FINETUNE_LORA_TARGET_MODULES: List[str] = []
+    FINETUNE_CHECKPOINT_STEPS: int = 50
+    FINETUNE_POLL_SECONDS: float = 2.0
+    # Load finished adapters into the model cache straight away
+    FINETUNE_HOT_LOAD: bool = True
+    WORKERS: int = 1
+    WEB_SEARCH_URL: str = "https://html.duckduckgo.com/html/"
+
     DEFAULT_DEVICE: str = "cpu"
+    # float32, float16, bfloat16 or int8 (dynamic quantization, CPU only).
+    # float16 applies on GPU; CPU models load as float32 unless MODEL_LOAD_MODES says otherwise
     DEFAULT_DTYPE: str = "float16"
+    MODEL_LOAD_MODES: Dict[str, str] = {}
     MODEL_CACHE_DIR: str = "./model_cache"
+    MODEL_MEMORY_BUDGET_MB: int = 4096
+    PRELOAD_MODELS: List[str] = []
+
+    # Target model -> small draft model with the same tokenizer for speculative decoding
+    DRAFT_MODELS: Dict[str, str] = {}
+    DRAFT_NUM_TOKENS: int = 5
+
+    PREFIX_CACHE_MAX_MB: int = 1024
+    PREFIX_CACHE_SPILL_DIR: str = ""
+    PREFIX_CACHE_SPILL_MAX_MB: int = 4096
+
+    HISTORY_MAX_TOKENS: int = 1500
+    HISTORY_SUMMARY_MAX_TOKENS: int = 300
+    HISTORY_COMPACT_RATIO: float = 0.6
+    # Conversations whose history is cached per worker
+    HISTORY_CACHE_CONVERSATIONS: int = 256
+    SUMMARY_MODEL: str = "Qwen/Qwen2.5-7B-Instruct"
 
 settings = Settings()
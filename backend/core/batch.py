@@ -0,0 +1,166 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from config.settings import settings
+from core.inference_engine import inference_engine
+from core.prefetch import normalize_draft
+from core.request_policy import deadline_scope, percentile
+from core.retriever import retriever
+from core.scheduler import Priority, QueueFull, client_scope
+from core.tensorlink_manager import tensorlink_manager
+from schema import BatchItem, ChatResponse, ChatSettings, InferenceMode
+
+
+class BatchRunner:
+    """
+    Runs many chat messages through the normal retrieval and inference path.
+
+    At most concurrency items generate at once, at background priority so a
+    bulk job yields to interactive chat. Items with an identical prompt
+    (message, history and settings) share one generation, and items whose
+    messages differ only in case, spacing or punctuation share one
+    classification and retrieval. Results are yielded as they complete,
+    followed by a summary with throughput and latency percentiles.
+    """
+    def __init__(
+        self,
+        max_items: int = settings.BATCH_MAX_ITEMS,
+        max_concurrency: int = settings.BATCH_MAX_CONCURRENCY,
+        retries: int = settings.BATCH_QUEUE_RETRIES
+    ):
+        self.max_items = max_items
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+
+    async def run(
+        self,
+        items: List[BatchItem],
+        chat_settings: ChatSettings,
+        concurrency: int = settings.BATCH_DEFAULT_CONCURRENCY,
+        client_id: str = "batch"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields:
+            One dict per item, in completion order, with its index and id and
+            either the response or an error; then {"summary": ...}
+        """
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, self.max_concurrency)))
+        mode = tensorlink_manager.get_mode()
+        generations: Dict[str, asyncio.Task] = {}
+        preparations: Dict[str, Tuple[Any, asyncio.Task]] = {}
+        results: asyncio.Queue = asyncio.Queue()
+        stats = {"items": len(items), "completed": 0, "failed": 0, "deduplicated": 0, "shared_retrieval": 0}
+        latencies: List[float] = []
+        start = time.perf_counter()
+
+        async def generate(item: BatchItem) -> Tuple[ChatResponse, float]:
+            async with semaphore:
+                started = time.perf_counter()
+                with deadline_scope(settings.CHAT_DEADLINE_SECONDS):
+                    response = await self._generate(item, chat_settings, mode, preparations, stats)
+                return response, time.perf_counter() - started
+
+        async def process(index: int, item: BatchItem):
+            key = prompt_key(item, chat_settings)
+            deduplicated = key in generations
+            if deduplicated:
+                stats["deduplicated"] += 1
+            else:
+                generations[key] = asyncio.create_task(generate(item))
+
+            result = {"index": index, "id": item.id}
+            try:
+                response, seconds = await asyncio.shield(generations[key])
+                result.update(response=response.response, metadata=response.metadata, latency_ms=round(seconds * 1000, 1))
+                if deduplicated:
+                    result["deduplicated"] = True
+                else:
+                    latencies.append(seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result["error"] = str(e) or type(e).__name__
+            await results.put(result)
+
+        # Tasks inherit the client, so the scheduler queues the whole batch as one client
+        with client_scope(client_id):
+            tasks = [asyncio.create_task(process(index, item)) for index, item in enumerate(items)]
+        try:
+            for _ in tasks:
+                result = await results.get()
+                stats["failed" if "error" in result else "completed"] += 1
+                yield result
+
+            elapsed = time.perf_counter() - start
+            yield {
+                "summary": {
+                    **stats,
+                    "generations": len(generations),
+                    "elapsed_seconds": round(elapsed, 3),
+                    "items_per_second": round(len(items) / elapsed, 3) if elapsed else None,
+                    "latency_ms": {
+                        "p50": round(percentile(latencies, 50) * 1000, 1),
+                        "p95": round(percentile(latencies, 95) * 1000, 1),
+                        "max": round(max(latencies) * 1000, 1)
+                    } if latencies else None
+                }
+            }
+        finally:
+            # The client went away or the batch finished; stop anything still running
+            for task in tasks + list(generations.values()) + [task for _, task in preparations.values()]:
+                task.cancel()
+
+    async def _generate(
+        self,
+        item: BatchItem,
+        chat_settings: ChatSettings,
+        mode: InferenceMode,
+        preparations: Dict[str, Tuple[Any, asyncio.Task]],
+        stats: Dict[str, int]
+    ) -> ChatResponse:
+        history = [{"role": turn.role, "content": turn.content} for turn in item.history or []]
+
+        for attempt in range(self.retries + 1):
+            try:
+                if mode != InferenceMode.API:
+                    return await inference_engine.pytorch_inference(
+                        model_name=chat_settings.modelName,
+                        message=item.message,
+                        history=history,
+                        priority=Priority.BACKGROUND
+                    )
+
+                retrieval_key = normalize_draft(item.message)
+                if retrieval_key not in preparations:
+                    context = retriever.new_context(item.message)
+                    preparations[retrieval_key] = (context, asyncio.create_task(retriever.prepare_context(context)))
+                elif attempt == 0:
+                    stats["shared_retrieval"] += 1
+                context, preparation = preparations[retrieval_key]
+                prepared = await asyncio.shield(preparation)
+
+                return await inference_engine.api_inference(
+                    model_name=chat_settings.modelName,
+                    message=item.message,
+                    temperature=chat_settings.temperature,
+                    history=history,
+                    context=context,
+                    prepared=prepared,
+                    priority=Priority.BACKGROUND
+                )
+            except QueueFull:
+                # Background calls are shed first when the server is busy; back off and retry
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+
+def prompt_key(item: BatchItem, chat_settings: ChatSettings) -> str:
+    """Items with the same key would send the same request, so one generation serves them all."""
+    history = [(turn.role, turn.content) for turn in item.history or []]
+    return json.dumps([chat_settings.modelName, chat_settings.temperature, " ".join(item.message.split()), history])
+
+
+batch_runner = BatchRunner()
@@ -0,0 +1,317 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_chat ON messages(chat_id, seq);
+CREATE INDEX IF NOT EXISTS chats_updated ON chats(updated_at DESC);
+CREATE TABLE IF NOT EXISTS deleted_chats (
+    seq INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sequence (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO sequence (id, value) VALUES (0, 0);
+CREATE TABLE IF NOT EXISTS imported_files (
+    chat_id TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+class ChatStore:
+    """
+    Backend-owned chat history in SQLite (WAL mode).
+
+    Every message gets a global, increasing sequence number, so appending is a
+    single insert and readers such as the retriever can ask for just what has
+    changed since the last sequence number they saw instead of re-reading
+    every conversation. WAL lets those readers run alongside the writer.
+    """
+    def __init__(self, path: str = settings.CHAT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def append_message(self, chat_id: str, role: str, content: str, timestamp: Any = None) -> int:
+        """Append one message to a chat, creating the chat if needed. Returns its sequence number."""
+        timestamp_ms = to_timestamp_ms(timestamp)
+        with self._write_lock, self._connection() as conn:
+            self._ensure_chat(conn, chat_id, timestamp_ms)
+            seq = self._insert_message(conn, chat_id, role, content, timestamp_ms)
+            conn.execute(
+                "UPDATE chats SET updated_at = MAX(updated_at, ?), message_count = message_count + 1, last_seq = ? WHERE id = ?",
+                (timestamp_ms, seq, chat_id)
+            )
+        return seq
+
+    def list_chats(self, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """Chats, most recently updated first."""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, created_at, updated_at, message_count, last_seq FROM chats ORDER BY updated_at DESC, id LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+        return {"chats": [dict(row) for row in rows], "total": total, "limit": limit, "offset": offset}
+
+    def get_chat(self, chat_id: str, after_seq: int = 0, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """A chat and its messages after after_seq, or None if it doesn't exist."""
+        conn = self._connection()
+        chat = conn.execute(
+            "SELECT id, created_at, updated_at, message_count, last_seq FROM chats WHERE id = ?", (chat_id,)
+        ).fetchone()
+        if chat is None:
+            return None
+
+        rows = conn.execute(
+            "SELECT seq, role, content, timestamp FROM messages WHERE chat_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (chat_id, after_seq, -1 if limit is None else limit)
+        ).fetchall()
+        return {**dict(chat), "messages": [dict(row) for row in rows]}
+
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Messages appended, and chats deleted, after sequence number seq.
+
+        Returns:
+            Dict with "messages" (each with chat_id), "deleted" chat ids and
+            "last_seq" to pass as seq next time
+        """
+        conn = self._connection()
+        # The counter only advances when a write commits, so everything up to it is visible
+        current = self.last_seq()
+        rows = conn.execute(
+            "SELECT seq, chat_id, role, content, timestamp FROM messages WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?",
+            (seq, current, limit)
+        ).fetchall()
+        messages = [dict(row) for row in rows]
+        more = len(messages) == limit
+        last_seq = messages[-1]["seq"] if more else current
+
+        # Deletions draw from the same sequence, so one cursor covers both
+        deleted = conn.execute(
+            "SELECT chat_id FROM deleted_chats WHERE seq > ? AND seq <= ? ORDER BY seq", (seq, last_seq)
+        ).fetchall()
+
+        return {"messages": messages, "deleted": [row[0] for row in deleted], "last_seq": last_seq, "more": more}
+
+    def last_seq(self) -> int:
+        return self._connection().execute("SELECT value FROM sequence WHERE id = 0").fetchone()[0]
+
+    def delete_chat(self, chat_id: str) -> bool:
+        with self._write_lock, self._connection() as conn:
+            return self._remove_chat(conn, chat_id)
+
+    def chat_versions(self) -> Dict[str, Dict[str, int]]:
+        """Every chat's last sequence number and message count, for cheap drift checks."""
+        rows = self._connection().execute("SELECT id, last_seq, message_count FROM chats").fetchall()
+        return {row["id"]: {"last_seq": row["last_seq"], "message_count": row["message_count"]} for row in rows}
+
+    def conversations(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Every chat's messages, keyed by chat id, in one pass over the table."""
+        conversations: Dict[str, List[Dict[str, Any]]] = {}
+        rows = self._connection().execute("SELECT chat_id, seq, role, content, timestamp FROM messages ORDER BY chat_id, seq")
+        for row in rows:
+            conversations.setdefault(row["chat_id"], []).append(dict(row))
+        return conversations
+
+    def iter_messages(self, until_seq: Optional[int] = None, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Every message up to until_seq, ordered by chat id then sequence number,
+        read a page at a time. The order is stable, so a reader can stop and
+        later skip back to where it was.
+        """
+        until_seq = self.last_seq() if until_seq is None else until_seq
+        after = ("", 0)
+        while True:
+            rows = self._connection().execute(
+                "SELECT chat_id, seq, role, content, timestamp FROM messages "
+                "WHERE (chat_id, seq) > (?, ?) AND seq <= ? ORDER BY chat_id, seq LIMIT ?",
+                (*after, until_seq, page_size)
+            ).fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < page_size:
+                return
+            after = (rows[-1]["chat_id"], rows[-1]["seq"])
+
+    def import_json_dir(self, chat_dir: str = settings.CHAT_DIR) -> Dict[str, int]:
+        """
+        Reconcile the store with the renderer's per-chat JSON files.
+
+        New files are imported. A file edited since it was last imported
+        replaces the chat's messages if its contents differ from the store's,
+        and chats whose imported file has since been removed are deleted.
+        Unchanged files are skipped on the modification time alone, so
+        running it again is cheap.
+        """
+        counts = {"imported": 0, "updated": 0, "removed": 0, "skipped": 0, "failed": 0, "messages": 0}
+        if not os.path.isdir(chat_dir):
+            return counts
+
+        imported_files = {
+            row["chat_id"]: row["mtime_ns"]
+            for row in self._connection().execute("SELECT chat_id, mtime_ns FROM imported_files")
+        }
+        present = set()
+
+        for file in sorted(os.listdir(chat_dir)):
+            if not file.endswith(".json"):
+                continue
+            chat_id = file[:-len(".json")]
+            path = os.path.join(chat_dir, file)
+            present.add(chat_id)
+
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+                if imported_files.get(chat_id) == mtime_ns:
+                    counts["skipped"] += 1
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    parsed = json.load(f)
+            except Exception as e:
+                print(f"Error importing chat {file}: {e}")
+                counts["failed"] += 1
+                continue
+
+            rows = [
+                (message.get("role", "unknown"), message.get("content", ""), to_timestamp_ms(message.get("timestamp")))
+                for message in parsed
+                if isinstance(message, dict) and message.get("role", "system") != "system"
+            ]
+
+            with self._write_lock, self._connection() as conn:
+                stored = conn.execute("SELECT role, content FROM messages WHERE chat_id = ? ORDER BY seq", (chat_id,)).fetchall()
+                exists = conn.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone() is not None
+                conn.execute("INSERT OR REPLACE INTO imported_files (chat_id, mtime_ns) VALUES (?, ?)", (chat_id, mtime_ns))
+
+                # The backend saves chat turns as they happen, so a touched file usually matches already
+                if exists and [tuple(row) for row in stored] == [row[:2] for row in rows]:
+                    counts["skipped"] += 1
+                    continue
+
+                if exists:
+                    self._remove_chat(conn, chat_id)
+                self._write_chat(conn, chat_id, rows)
+
+            counts["updated" if exists else "imported"] += 1
+            counts["messages"] += len(rows)
+
+        for chat_id in set(imported_files) - present:
+            with self._write_lock, self._connection() as conn:
+                conn.execute("DELETE FROM imported_files WHERE chat_id = ?", (chat_id,))
+                if self._remove_chat(conn, chat_id):
+                    counts["removed"] += 1
+
+        return counts
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection; sqlite3 connections can't be shared across threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._initialize()
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize(self):
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    @classmethod
+    def _remove_chat(cls, conn: sqlite3.Connection, chat_id: str) -> bool:
+        deleted = conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,)).rowcount
+        if deleted:
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            conn.execute("INSERT INTO deleted_chats (seq, chat_id) VALUES (?, ?)", (cls._next_seq(conn), chat_id))
+        return bool(deleted)
+
+    @classmethod
+    def _write_chat(cls, conn: sqlite3.Connection, chat_id: str, rows: List[tuple]):
+        """Create a chat from (role, content, timestamp_ms) rows."""
+        created_at = min((row[2] for row in rows), default=to_timestamp_ms(None))
+        cls._ensure_chat(conn, chat_id, created_at)
+
+        seq = 0
+        for role, content, timestamp_ms in rows:
+            seq = cls._insert_message(conn, chat_id, role, content, timestamp_ms)
+
+        conn.execute(
+            "UPDATE chats SET updated_at = ?, message_count = ?, last_seq = ? WHERE id = ?",
+            (max((row[2] for row in rows), default=created_at), len(rows), seq, chat_id)
+        )
+
+    @staticmethod
+    def _ensure_chat(conn: sqlite3.Connection, chat_id: str, timestamp_ms: int):
+        conn.execute(
+            "INSERT OR IGNORE INTO chats (id, created_at, updated_at) VALUES (?, ?, ?)",
+            (chat_id, timestamp_ms, timestamp_ms)
+        )
+
+    @classmethod
+    def _insert_message(cls, conn: sqlite3.Connection, chat_id: str, role: str, content: str, timestamp_ms: int) -> int:
+        seq = cls._next_seq(conn)
+        conn.execute(
+            "INSERT INTO messages (seq, chat_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (seq, chat_id, role, content, timestamp_ms)
+        )
+        return seq
+
+    @staticmethod
+    def _next_seq(conn: sqlite3.Connection) -> int:
+        """Take the next sequence number. The UPDATE holds the write lock until commit."""
+        conn.execute("UPDATE sequence SET value = value + 1 WHERE id = 0")
+        return conn.execute("SELECT value FROM sequence WHERE id = 0").fetchone()[0]
+
+
+def to_timestamp_ms(value: Any) -> int:
+    """Milliseconds since the epoch from the renderer's ms numbers or ISO strings; now if missing."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+        except ValueError:
+            pass
+    return int(time.time() * 1000)
+
+
+chat_store = ChatStore()
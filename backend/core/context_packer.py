@@ -0,0 +1,199 @@
+import hashlib
+import re
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+WORD = re.compile(r"\w+")
+
+
+class Candidate:
+    """A piece of context that could go into the prompt."""
+    def __init__(
+        self,
+        source: str,
+        content: str,
+        relevance: float,
+        header: Callable[["Candidate"], str],
+        group: Optional[str] = None,
+        start: Optional[int] = None,
+        embedding: Optional["np.ndarray"] = None,
+        info: Optional[Dict[str, Any]] = None
+    ):
+        self.source = source
+        self.content = content
+        self.relevance = relevance
+        # Built at render time, so merged candidates get a header reflecting the merge
+        self.header = header
+        # Chunks in the same group with character offsets can be merged when they overlap
+        self.group = group
+        self.start = start
+        self.embedding = embedding
+        self.info = info or {}
+        self.tokens = 0
+        self._shingles = None
+        self._simhash = None
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.content)
+
+    def render(self) -> str:
+        return f"{self.header(self)}{self.content.strip()}\n---"
+
+    @property
+    def shingles(self) -> set:
+        if self._shingles is None:
+            words = WORD.findall(self.content.lower())
+            self._shingles = {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+        return self._shingles
+
+    @property
+    def simhash(self) -> int:
+        if self._simhash is None:
+            self._simhash = simhash(self.shingles)
+        return self._simhash
+
+
+class ContextPacker:
+    """
+    Chooses which retrieved context goes into the prompt.
+
+    Candidates from every source compete for one token budget. Overlapping
+    neighbouring chunks of the same conversation are merged first and
+    near-duplicates (SimHash) dropped. Selection is a greedy knapsack on
+    marginal value per token, where the marginal value is an MMR trade-off
+    between relevance and redundancy with what's already been chosen; it
+    skips candidates that don't fit rather than stopping at the first one.
+    """
+    def __init__(
+        self,
+        diversity: float = settings.CONTEXT_MMR_LAMBDA,
+        duplicate_bits: int = settings.CONTEXT_DUPLICATE_BITS
+    ):
+        self.diversity = diversity
+        self.duplicate_bits = duplicate_bits
+
+    def pack(
+        self,
+        candidates: List[Candidate],
+        max_tokens: int,
+        count_tokens: Callable[[str], int]
+    ) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict with the selected candidates in prompt order, their total tokens,
+            and counts of what was merged and dropped
+        """
+        merged = self.merge_adjacent(candidates)
+        unique = self.drop_duplicates(merged)
+
+        for candidate in unique:
+            candidate.tokens = count_tokens(candidate.render())
+
+        selected = self.select(unique, max_tokens)
+        # Keep each source together, most relevant first
+        sources = list(dict.fromkeys(candidate.source for candidate in candidates))
+        selected.sort(key=lambda candidate: (sources.index(candidate.source), -candidate.relevance))
+
+        return {
+            "selected": selected,
+            "tokens": sum(candidate.tokens for candidate in selected),
+            "stats": {
+                "candidates": len(candidates),
+                "merged": len(candidates) - len(merged),
+                "duplicates": len(merged) - len(unique),
+                "selected": len(selected)
+            }
+        }
+
+    def merge_adjacent(self, candidates: List[Candidate]) -> List[Candidate]:
+        """Join chunks of the same group whose character ranges touch or overlap."""
+        result = [candidate for candidate in candidates if candidate.group is None or candidate.start is None]
+        groups: Dict[str, List[Candidate]] = {}
+        for candidate in candidates:
+            if candidate.group is not None and candidate.start is not None:
+                groups.setdefault(candidate.group, []).append(candidate)
+
+        for group in groups.values():
+            group.sort(key=lambda candidate: candidate.start)
+            current = group[0]
+            for candidate in group[1:]:
+                if candidate.start <= current.end:
+                    current = Candidate(
+                        source=current.source,
+                        content=current.content + candidate.content[current.end - candidate.start:],
+                        relevance=max(current.relevance, candidate.relevance),
+                        header=current.header,
+                        group=current.group,
+                        start=current.start,
+                        embedding=current.embedding if current.relevance >= candidate.relevance else candidate.embedding,
+                        info={**current.info, "merged": current.info.get("merged", 1) + candidate.info.get("merged", 1)}
+                    )
+                else:
+                    result.append(current)
+                    current = candidate
+            result.append(current)
+
+        return result
+
+    def drop_duplicates(self, candidates: List[Candidate]) -> List[Candidate]:
+        """Keep the most relevant of each set of candidates whose SimHashes are within duplicate_bits."""
+        kept: List[Candidate] = []
+        for candidate in sorted(candidates, key=lambda candidate: -candidate.relevance):
+            if all(bin(candidate.simhash ^ other.simhash).count("1") > self.duplicate_bits for other in kept):
+                kept.append(candidate)
+        return kept
+
+    def select(self, candidates: List[Candidate], max_tokens: int) -> List[Candidate]:
+        remaining = [candidate for candidate in candidates if 0 < candidate.tokens <= max_tokens]
+        selected: List[Candidate] = []
+        budget = max_tokens
+
+        while remaining:
+            best, best_density = None, None
+            for candidate in remaining:
+                if candidate.tokens > budget:
+                    continue
+                redundancy = max((self.similarity(candidate, other) for other in selected), default=0.0)
+                value = self.diversity * candidate.relevance - (1 - self.diversity) * redundancy
+                density = value / candidate.tokens
+                if value > 0 and (best_density is None or density > best_density):
+                    best, best_density = candidate, density
+
+            if best is None:
+                break
+            selected.append(best)
+            remaining.remove(best)
+            budget -= best.tokens
+
+        # Greedy by density can lose to one large, highly relevant item; take whichever is worth more
+        best_single = max(remaining + selected, key=lambda candidate: candidate.relevance, default=None)
+        if best_single is not None and best_single not in selected and best_single.relevance > sum(c.relevance for c in selected):
+            return [best_single]
+        return selected
+
+    @staticmethod
+    def similarity(a: Candidate, b: Candidate) -> float:
+        """Cosine similarity of embeddings when both have one, word-trigram Jaccard otherwise."""
+        if a.embedding is not None and b.embedding is not None:
+            import numpy as np
+
+            return float(np.dot(a.embedding, b.embedding) / ((np.linalg.norm(a.embedding) * np.linalg.norm(b.embedding)) or 1.0))
+        union = len(a.shingles | b.shingles)
+        return len(a.shingles & b.shingles) / union if union else 0.0
+
+
+def simhash(features: set, bits: int = 64) -> int:
+    weights = [0] * bits
+    for feature in features:
+        value = int.from_bytes(hashlib.md5(feature.encode()).digest()[:8], "big")
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+context_packer = ContextPacker()
@@ -0,0 +1,212 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import tiktoken
+from config.prompts import summarize_prompt
+from config.settings import settings
+from core.chat_store import chat_store
+from core.metrics import span
+from core.request_policy import DeadlineExceeded, hedged_requester
+from core.scheduler import Priority, scheduler
+
+
+class ConversationMemory:
+    """
+    Token-bounded conversation history.
+
+    Recent turns are kept verbatim while they fit in the history budget. Once
+    they don't, the oldest turns are folded into a rolling summary; only the
+    newly folded turns are sent to the summarizer, along with the previous
+    summary, so the cost of compaction doesn't grow with the conversation.
+
+    The chat store is the source of truth. Each cached conversation remembers
+    the last sequence number it has seen, and picks up messages written since
+    (by this worker or another) before building history. At most
+    max_conversations are cached, least recently used dropped first.
+    """
+    def __init__(
+        self,
+        max_tokens: int = settings.HISTORY_MAX_TOKENS,
+        summary_max_tokens: int = settings.HISTORY_SUMMARY_MAX_TOKENS,
+        compact_ratio: float = settings.HISTORY_COMPACT_RATIO,
+        max_conversations: int = settings.HISTORY_CACHE_CONVERSATIONS
+    ):
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.compact_ratio = compact_ratio
+        self.max_conversations = max_conversations
+        self._encoding = None
+        self._conversations: "OrderedDict[str, Dict]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        return self._encoding
+
+    async def build_history(self, conversation_id: str, query: str = "", max_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Return the history to send with the next message, within max_tokens.
+
+        Returns:
+            List of {"role", "content"} items, led by a system summary item when
+            older turns have been compacted
+        """
+        max_tokens = max_tokens or self.max_tokens
+
+        async with self._locks.setdefault(conversation_id, asyncio.Lock()):
+            state = await self._get_state(conversation_id)
+            turns = state["turns"]
+
+            # The pending message may already be in the store; leave it out of the
+            # history without dropping it from the cached turns
+            if len(turns) > state["summarized"] and turns[-1]["role"] == "user" and turns[-1]["content"] == query:
+                turns = turns[:-1]
+
+            recent_budget = max_tokens - state["summary_tokens"]
+            recent_tokens = sum(turn["tokens"] for turn in turns[state["summarized"]:])
+
+            if recent_tokens > recent_budget:
+                await self._compact(state, turns, int((max_tokens - self.summary_max_tokens) * self.compact_ratio))
+
+            history = []
+            if state["summary"]:
+                history.append({"role": "system", "content": f"Summary of the earlier conversation: {state['summary']}"})
+
+            history.extend({"role": turn["role"], "content": turn["content"]} for turn in turns[state["summarized"]:])
+            return history
+
+    def forget(self, conversation_id: str):
+        """Drop a conversation's cached state, e.g. when the chat is deleted."""
+        self._conversations.pop(conversation_id, None)
+        lock = self._locks.get(conversation_id)
+        if lock is not None and not lock.locked():
+            del self._locks[conversation_id]
+
+    async def _compact(self, state: Dict, turns: List[Dict], target_tokens: int):
+        """
+        Fold the oldest unsummarized of turns (a prefix of the state's turns)
+        into the summary until the rest fit target_tokens.
+        """
+        recent_tokens = sum(turn["tokens"] for turn in turns[state["summarized"]:])
+
+        cut = state["summarized"]
+        # Always keep the latest turn verbatim, even if it alone exceeds the target
+        while cut < len(turns) - 1 and recent_tokens > target_tokens:
+            recent_tokens -= turns[cut]["tokens"]
+            cut += 1
+
+        folded = turns[state["summarized"]:cut]
+        if not folded:
+            return
+
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in folded)
+        with span("history_summarization"):
+            summary = await self._summarize(state["summary"], transcript)
+
+        state["summary"] = self._truncate(summary, self.summary_max_tokens)
+        state["summary_tokens"] = self.num_tokens(state["summary"])
+        state["summarized"] = cut
+
+    async def _summarize(self, summary: str, transcript: str) -> str:
+        """Ask the model to extend the summary, falling back to an extractive one."""
+        max_words = int(self.summary_max_tokens * 0.75)
+
+        try:
+            payload = {
+                "hf_name": settings.SUMMARY_MODEL,
+                "message": summarize_prompt(summary, transcript, max_words),
+                "max_length": self.summary_max_tokens * 2,
+                "max_new_tokens": self.summary_max_tokens,
+                "temperature": 0.1,
+                "do_sample": False,
+                "num_beams": 1,
+                "history": []
+            }
+
+            async with scheduler.slot(Priority.BACKGROUND):
+                response = await hedged_requester.post("/generate", payload, timeout=30, kind="summary")
+
+            if response.status_code == 200:
+                text = response.json().get("response", "").strip()
+                if text:
+                    return text
+
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Summarization error: {e}")
+
+        return self._extractive_summary(summary, transcript)
+
+    def _extractive_summary(self, summary: str, transcript: str) -> str:
+        """Keep the first sentence of each folded message, newest information last."""
+        lines = []
+        for line in transcript.split("\n"):
+            line = line.strip()
+            if line:
+                lines.append(line.split(". ")[0].rstrip(".") + ".")
+
+        combined = f"{summary} {' '.join(lines)}".strip()
+        # Oldest information is the first to go when the summary is full
+        tokens = self.encoding.encode(combined)
+        return self.encoding.decode(tokens[-self.summary_max_tokens:])
+
+    async def _get_state(self, conversation_id: str) -> Dict:
+        """The cached conversation, brought up to date with the chat store."""
+        state = self._conversations.get(conversation_id)
+        if state is None:
+            state = self._new_state(conversation_id)
+
+        try:
+            chat = await asyncio.to_thread(chat_store.get_chat, conversation_id, state["seq"])
+        except Exception as e:
+            print(f"Error loading conversation {conversation_id}: {e}")
+            chat = {"message_count": state["count"], "messages": []}
+
+        if chat is None:
+            if state["seq"]:
+                state = self._new_state(conversation_id)
+        elif chat["messages"]:
+            # Fewer stored messages than we hold plus the new ones: the chat was replaced or recreated
+            if state["count"] + len(chat["messages"]) > chat["message_count"]:
+                state = self._new_state(conversation_id)
+                chat = await asyncio.to_thread(chat_store.get_chat, conversation_id) or chat
+            self._append(state, chat["messages"])
+
+        # Other conversations may have pushed this one out while we read the store
+        self._conversations[conversation_id] = state
+        self._conversations.move_to_end(conversation_id)
+        while len(self._conversations) > self.max_conversations:
+            self.forget(next(iter(self._conversations)))
+        return state
+
+    def _new_state(self, conversation_id: str) -> Dict:
+        state = {"turns": [], "summary": "", "summary_tokens": 0, "summarized": 0, "seq": 0, "count": 0}
+        self._conversations[conversation_id] = state
+        return state
+
+    def _append(self, state: Dict, messages: List[Dict]):
+        state["turns"].extend(
+            self._make_turn(message["role"], message["content"])
+            for message in messages
+            if message["role"] != "system" and message["content"]
+        )
+        state["count"] += len(messages)
+        state["seq"] = messages[-1]["seq"]
+
+    def _make_turn(self, role: str, content: str) -> Dict:
+        return {"role": role, "content": content, "tokens": self.num_tokens(content)}
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encoding.encode(text)
+        return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+
+    def num_tokens(self, string: str) -> int:
+        """Returns the number of tokens in a text string."""
+        return len(self.encoding.encode(string))
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,20 @@
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+from sentence_transformers import SentenceTransformer
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """Wrapper to make SentenceTransformer compatible with LangChain."""
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self.model = SentenceTransformer(model_name)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents."""
+        embeddings = self.model.encode(texts, convert_to_tensor=False)
+        return embeddings.tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        embedding = self.model.encode([text], convert_to_tensor=False)
+        return embedding[0].tolist()
@@ -0,0 +1,401 @@
+import asyncio
+import importlib.util
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from core.chat_store import chat_store
+from core.model_manager import model_manager
+from core.shared_state import shared_state
+
+JOB_PREFIX = "finetune:"
+
+
+class FinetuneJobs:
+    """
+    Queue of LoRA fine-tuning jobs, run one at a time in a separate process.
+
+    The job table lives in the shared state store, so any worker can accept
+    or report on a job, but only the index writer process runs them. Each
+    job trains in its own process with a bounded number of CPU threads and
+    at lower scheduling priority, so chat serving keeps going; the process
+    writes its progress back to the job record. A job that was running when
+    the server stopped is queued again and resumes from its last checkpoint.
+    When a job finishes its adapter is registered with the model manager
+    and loaded, so it can be chatted with without a restart.
+    """
+    def __init__(self, root: str = settings.FINETUNE_DIR, poll_seconds: float = settings.FINETUNE_POLL_SECONDS):
+        self.root = root
+        self.poll_seconds = poll_seconds
+        self._process: Optional[multiprocessing.Process] = None
+        self._job_id: Optional[str] = None
+
+    def submit(self, model_name: str, chat_history: List[Dict[str, Any]], include_chat_store: bool = True) -> Dict[str, Any]:
+        """
+        Queue a job training model_name on chat_history and, unless told not
+        to, every exchange in the chat store as of now.
+
+        Raises:
+            RuntimeError: if the training dependencies aren't installed
+        """
+        # Training imports peft in its own process; fail here rather than there
+        if importlib.util.find_spec("peft") is None:
+            raise RuntimeError("Fine-tuning needs the peft package; install it with `pip install peft`")
+
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.root, "jobs", job_id)
+        os.makedirs(job_dir)
+
+        # The request's own conversation is trained on first, then the stored chats
+        with open(os.path.join(job_dir, "examples.jsonl"), "w", encoding="utf-8") as f:
+            for prompt, response in conversation_pairs(chat_history):
+                f.write(json.dumps({"prompt": prompt, "response": response}) + "\n")
+
+        job = {
+            "id": job_id,
+            "model": model_name,
+            "adapter_name": f"{model_name}-ft-{job_id}",
+            "status": "queued",
+            "progress": 0.0,
+            "created_at": time.time(),
+            "include_chat_store": include_chat_store,
+            # Chats added after submission don't shift the example order a resumed job skips through
+            "until_seq": chat_store.last_seq() if include_chat_store else 0,
+            "config": {
+                "epochs": settings.FINETUNE_EPOCHS,
+                "max_steps": settings.FINETUNE_MAX_STEPS,
+                "batch_size": settings.FINETUNE_BATCH_SIZE,
+                "max_length": settings.FINETUNE_MAX_LENGTH,
+                "learning_rate": settings.FINETUNE_LEARNING_RATE,
+                "lora_rank": settings.FINETUNE_LORA_RANK,
+                "lora_alpha": settings.FINETUNE_LORA_ALPHA,
+                "lora_dropout": settings.FINETUNE_LORA_DROPOUT,
+                "lora_target_modules": settings.FINETUNE_LORA_TARGET_MODULES,
+                "checkpoint_steps": settings.FINETUNE_CHECKPOINT_STEPS
+            },
+            "step": 0,
+            "total_steps": None,
+            "examples": None,
+            "tokens": 0,
+            "tokens_per_second": None,
+            "eta_seconds": None,
+            "loss": None,
+            "error": None
+        }
+        shared_state.set(JOB_PREFIX + job_id, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return shared_state.get(JOB_PREFIX + job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """All jobs, newest first."""
+        jobs = shared_state.items(JOB_PREFIX).values()
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job, or ask a running one to checkpoint and stop."""
+        def cancelled(job):
+            if job.get("status") == "queued":
+                return {**job, "status": "cancelled", "finished_at": time.time()}
+            if job.get("status") == "running":
+                return {**job, "status": "cancelling"}
+            return job
+
+        if self.get(job_id) is None:
+            return None
+        return shared_state.update(JOB_PREFIX + job_id, cancelled, default={})
+
+    async def run(self):
+        """Start queued jobs one at a time and collect finished ones. Runs in the writer process."""
+        self._recover()
+        while True:
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Fine-tuning runner error: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def _recover(self):
+        # Nothing can be running yet; jobs left running by the last server resume from their checkpoint
+        adapters = model_manager.adapters()
+        for job in self.list():
+            if job["status"] == "running":
+                update_job(job["id"], status="queued", resumes=job.get("resumes", 0) + 1)
+            elif job["status"] == "cancelling":
+                update_job(job["id"], status="cancelled", finished_at=time.time())
+            elif job["status"] == "completed" and job["adapter_name"] not in adapters:
+                # The server stopped between the job completing and its adapter being registered
+                model_manager.register_adapter(job["adapter_name"], job["model"], job["adapter_path"])
+                print(f"Registered adapter {job['adapter_name']} from fine-tuning job {job['id']}")
+
+    def _poll(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                return
+            self._finished(self._job_id, self._process.exitcode)
+            self._process, self._job_id = None, None
+
+        queued = [job for job in self.list() if job["status"] == "queued"]
+        if queued:
+            self._start(min(queued, key=lambda job: job["created_at"]))
+
+    def _start(self, job: Dict[str, Any]):
+        update_job(job["id"], status="running", error=None)
+        # Spawned rather than forked, so the child doesn't inherit the server's threads and sockets
+        process = multiprocessing.get_context("spawn").Process(
+            target=run_job, args=(job["id"],), name=f"finetune-{job['id']}", daemon=True
+        )
+        process.start()
+        self._process, self._job_id = process, job["id"]
+        print(f"Started fine-tuning job {job['id']} for {job['model']} (pid {process.pid})")
+
+    def _finished(self, job_id: str, exitcode: Optional[int]):
+        job = self.get(job_id)
+        if job is None:
+            return
+
+        if job["status"] == "completed":
+            model_manager.register_adapter(job["adapter_name"], job["model"], job["adapter_path"], preload=settings.FINETUNE_HOT_LOAD)
+            print(f"Fine-tuning job {job_id} finished, adapter available as {job['adapter_name']}")
+        elif job["status"] == "cancelling":
+            update_job(job_id, status="cancelled", finished_at=time.time())
+        elif job["status"] == "running":
+            # The process died without recording why, e.g. killed for running out of memory
+            update_job(job_id, status="failed", error=f"Training process exited with code {exitcode}", finished_at=time.time())
+
+
+class LoraTrainer:
+    """
+    Trains one job's LoRA adapter. Runs inside the job's own process.
+
+    Examples are streamed from the job's file and the chat store and
+    tokenized a batch at a time, so memory doesn't grow with the amount of
+    history. Loss is computed on the response tokens only. The adapter and
+    optimizer state are checkpointed every checkpoint_steps steps; a resumed
+    job loads them and skips the examples already trained on.
+    """
+    def __init__(self, job: Dict[str, Any], root: str = settings.FINETUNE_DIR):
+        self.job = job
+        self.config = job["config"]
+        self.job_dir = os.path.join(root, "jobs", job["id"])
+        self.checkpoint_dir = os.path.join(self.job_dir, "checkpoint")
+        self.adapter_dir = os.path.join(root, "adapters", job["id"])
+
+    def examples(self) -> Iterator[Tuple[str, str]]:
+        """(prompt, response) pairs, always in the same order."""
+        with open(os.path.join(self.job_dir, "examples.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                example = json.loads(line)
+                yield example["prompt"], example["response"]
+
+        if self.job["include_chat_store"]:
+            yield from conversation_pairs(chat_store.iter_messages(self.job["until_seq"]))
+
+    def train(self):
+        import torch
+        from peft import LoraConfig, PeftModel, get_peft_model
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        torch.set_num_threads(settings.FINETUNE_THREADS)
+        job_id, config = self.job["id"], self.config
+        batch_size = config["batch_size"]
+
+        total_examples = sum(1 for _ in self.examples())
+        if not total_examples:
+            raise ValueError("No training examples: no user message followed by an assistant reply")
+        steps_per_epoch = math.ceil(total_examples / batch_size)
+        total_steps = steps_per_epoch * config["epochs"]
+        if config["max_steps"]:
+            total_steps = min(total_steps, config["max_steps"])
+
+        tokenizer = AutoTokenizer.from_pretrained(self.job["model"])
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(self.job["model"], torch_dtype=torch.float32)
+
+        state = self._load_checkpoint(torch)
+        if state is None:
+            model = get_peft_model(model, LoraConfig(
+                task_type="CAUSAL_LM",
+                r=config["lora_rank"],
+                lora_alpha=config["lora_alpha"],
+                lora_dropout=config["lora_dropout"],
+                target_modules=config["lora_target_modules"] or None
+            ))
+        else:
+            model = PeftModel.from_pretrained(model, state["path"], is_trainable=True)
+
+        optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=config["learning_rate"])
+        step, tokens = 0, 0
+        if state is not None:
+            optimizer.load_state_dict(state["optimizer"])
+            step, tokens = state["step"], state["tokens"]
+
+        update_job(
+            job_id,
+            examples=total_examples,
+            total_steps=total_steps,
+            step=step,
+            progress=round(100 * step / total_steps, 1),
+            started_at=self.job.get("started_at") or time.time()
+        )
+
+        model.train()
+        session_start, session_steps, session_tokens = time.perf_counter(), 0, 0
+        last_report = 0.0
+
+        while step < total_steps:
+            epoch, offset = divmod(step, steps_per_epoch)
+            for batch in self._batches(tokenizer, torch, skip=offset * batch_size):
+                loss = model(**batch).loss
+                loss.backward()
+                optimizer.step()
+                optimizer.zero_grad()
+
+                step += 1
+                batch_tokens = int(batch["attention_mask"].sum())
+                tokens += batch_tokens
+                session_steps += 1
+                session_tokens += batch_tokens
+
+                if step % config["checkpoint_steps"] == 0:
+                    self._save_checkpoint(model, optimizer, step, tokens, torch)
+
+                now = time.perf_counter()
+                if now - last_report >= 1.0 or step >= total_steps:
+                    last_report = now
+                    elapsed = now - session_start
+                    update_job(
+                        job_id,
+                        step=step,
+                        epoch=epoch,
+                        tokens=tokens,
+                        loss=round(float(loss), 4),
+                        progress=round(100 * step / total_steps, 1),
+                        tokens_per_second=round(session_tokens / elapsed, 1),
+                        eta_seconds=round((total_steps - step) * elapsed / session_steps, 1)
+                    )
+                    if shared_state.get(JOB_PREFIX + job_id, {}).get("status") == "cancelling":
+                        self._save_checkpoint(model, optimizer, step, tokens, torch)
+                        update_job(job_id, status="cancelled", finished_at=time.time())
+                        return
+
+                if step >= total_steps or step % steps_per_epoch == 0:
+                    break
+            else:
+                # The stream ran out early (chats deleted since submission); the epoch is over
+                step = max(step, (epoch + 1) * steps_per_epoch)
+
+        shutil.rmtree(self.adapter_dir, ignore_errors=True)
+        model.save_pretrained(self.adapter_dir)
+        update_job(
+            job_id,
+            status="completed",
+            progress=100.0,
+            eta_seconds=0,
+            adapter_path=self.adapter_dir,
+            finished_at=time.time()
+        )
+
+    def _batches(self, tokenizer, torch, skip: int = 0) -> Iterator[Dict[str, Any]]:
+        examples = itertools.islice(self.examples(), skip, None)
+        while True:
+            chunk = list(itertools.islice(examples, self.config["batch_size"]))
+            if not chunk:
+                return
+            yield self._collate(chunk, tokenizer, torch)
+
+    def _collate(self, examples: List[Tuple[str, str]], tokenizer, torch) -> Dict[str, Any]:
+        """Pad a batch of prompt + response sequences; only response tokens are labelled."""
+        max_length = self.config["max_length"]
+        rows = []
+        for prompt, response in examples:
+            # Same layout chat_with_model generates from: each turn followed by EOS
+            prompt_ids = tokenizer(prompt + tokenizer.eos_token, add_special_tokens=False)["input_ids"]
+            response_ids = tokenizer(response + tokenizer.eos_token, add_special_tokens=False)["input_ids"]
+            if len(prompt_ids) + len(response_ids) > max_length:
+                # Keep the start of the response and as much of the end of the prompt as fits
+                response_ids = response_ids[:max(max_length // 2, max_length - len(prompt_ids))]
+                prompt_ids = prompt_ids[len(prompt_ids) - (max_length - len(response_ids)):]
+            rows.append((prompt_ids + response_ids, [-100] * len(prompt_ids) + response_ids))
+
+        width = max(len(ids) for ids, _ in rows)
+        pad = tokenizer.pad_token_id
+        return {
+            "input_ids": torch.tensor([ids + [pad] * (width - len(ids)) for ids, _ in rows]),
+            "attention_mask": torch.tensor([[1] * len(ids) + [0] * (width - len(ids)) for ids, _ in rows]),
+            "labels": torch.tensor([labels + [-100] * (width - len(labels)) for _, labels in rows])
+        }
+
+    def _save_checkpoint(self, model, optimizer, step: int, tokens: int, torch):
+        """Write the checkpoint beside the current one and swap it in, so a crash leaves one intact."""
+        staging, previous = self.checkpoint_dir + ".tmp", self.checkpoint_dir + ".old"
+        shutil.rmtree(staging, ignore_errors=True)
+        model.save_pretrained(staging)
+        torch.save({"optimizer": optimizer.state_dict(), "step": step, "tokens": tokens}, os.path.join(staging, "trainer_state.pt"))
+
+        if os.path.exists(self.checkpoint_dir):
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(self.checkpoint_dir, previous)
+        os.replace(staging, self.checkpoint_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+        update_job(self.job["id"], checkpoint_step=step)
+
+    def _load_checkpoint(self, torch) -> Optional[Dict[str, Any]]:
+        for path in (self.checkpoint_dir, self.checkpoint_dir + ".old"):
+            state_path = os.path.join(path, "trainer_state.pt")
+            if os.path.exists(state_path):
+                return {**torch.load(state_path), "path": path}
+        return None
+
+
+def run_job(job_id: str):
+    """Entry point of a job's training process."""
+    # Set before torch is imported so its thread pools are sized to match
+    threads = str(settings.FINETUNE_THREADS)
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+    if hasattr(os, "nice"):
+        # Training takes whatever CPU the API process leaves idle
+        os.nice(10)
+
+    try:
+        LoraTrainer(shared_state.get(JOB_PREFIX + job_id)).train()
+    except Exception as e:
+        print(f"Fine-tuning job {job_id} failed: {e}")
+        update_job(job_id, status="failed", error=str(e), finished_at=time.time())
+
+
+def update_job(job_id: str, **changes):
+    shared_state.update(JOB_PREFIX + job_id, lambda job: {**job, **changes}, default={})
+
+
+def conversation_pairs(messages: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, str]]:
+    """
+    (user message, assistant reply) for every reply that directly follows a
+    user message in the same chat. Replies marked with negative feedback are
+    left out.
+    """
+    previous = None
+    for message in messages:
+        if (
+            previous is not None
+            and message.get("role") == "assistant"
+            and previous.get("role") == "user"
+            and message.get("chat_id") == previous.get("chat_id")
+            and message.get("feedback") != "negative"
+            and previous.get("content") and message.get("content")
+        ):
+            yield previous["content"], message["content"]
+        previous = message
+
+
+finetune_jobs = FinetuneJobs()
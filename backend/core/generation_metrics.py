@@ -0,0 +1,88 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class GenerationMetrics:
+    """
+    Throughput and speculative decoding statistics for local generation.
+
+    Forward calls of the target and draft models are counted with hooks. In
+    assisted generation every target call verifies a run of draft tokens and
+    contributes one token of its own, so accepted draft tokens are estimated
+    as new_tokens - target_calls out of draft_calls proposed.
+    """
+    def __init__(self):
+        self._models: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, model_name: str, model, draft_model=None):
+        """Count forward calls while generating. Set run["new_tokens"] before leaving the block."""
+        run = {"new_tokens": 0, "target_calls": 0, "draft_calls": 0}
+        # Hooks go on the shared model, so concurrent generations see each other's
+        # forward calls; generate() runs in the calling thread, so count only ours
+        thread = threading.get_ident()
+
+        def count(key):
+            def hook(module, args, output):
+                if threading.get_ident() == thread:
+                    run[key] += 1
+            return hook
+
+        handles = [model.register_forward_hook(count("target_calls"))]
+        if draft_model is not None:
+            handles.append(draft_model.register_forward_hook(count("draft_calls")))
+
+        start = time.perf_counter()
+        try:
+            yield run
+        finally:
+            for handle in handles:
+                handle.remove()
+
+        run["seconds"] = time.perf_counter() - start
+        self._record(model_name, run, draft_model is not None)
+
+    def summary(self, model_name: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            names = [model_name] if model_name else list(self._models)
+            return {name: self._describe(self._models[name]) for name in names if name in self._models}
+
+    def _record(self, model_name: str, run: Dict[str, float], speculative: bool):
+        with self._lock:
+            totals = self._models.setdefault(model_name, {
+                "generations": 0, "new_tokens": 0, "seconds": 0.0,
+                "speculative_generations": 0, "speculative_tokens": 0, "target_calls": 0, "draft_calls": 0, "accepted_tokens": 0
+            })
+            totals["generations"] += 1
+            totals["new_tokens"] += run["new_tokens"]
+            totals["seconds"] += run["seconds"]
+
+            if speculative:
+                totals["speculative_generations"] += 1
+                totals["speculative_tokens"] += run["new_tokens"]
+                totals["target_calls"] += run["target_calls"]
+                totals["draft_calls"] += run["draft_calls"]
+                totals["accepted_tokens"] += max(run["new_tokens"] - run["target_calls"], 0)
+
+    @staticmethod
+    def _describe(totals: Dict[str, float]) -> Dict[str, Any]:
+        description = {
+            "generations": totals["generations"],
+            "new_tokens": totals["new_tokens"],
+            "tokens_per_second": round(totals["new_tokens"] / totals["seconds"], 2) if totals["seconds"] else 0.0
+        }
+
+        if totals["speculative_generations"]:
+            description["speculative"] = {
+                "generations": totals["speculative_generations"],
+                "acceptance_rate": round(totals["accepted_tokens"] / totals["draft_calls"], 3) if totals["draft_calls"] else 0.0,
+                "tokens_per_target_call": round(totals["speculative_tokens"] / totals["target_calls"], 2) if totals["target_calls"] else 0.0
+            }
+
+        return description
+
+
+generation_metrics = GenerationMetrics()
@@ -1,17 +1,47 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional
 
 import requests
 from config.settings import settings
+from core.metrics import span
+from core.request_context import RequestContext
+from core.request_policy import hedged_requester
+from core.retriever import retriever
+from core.scheduler import Priority, scheduler
 from fastapi import HTTPException
 from schema import ChatResponse
 
-from backend.core.retriever import retriever
-
 
 class InferenceEngine:
     @staticmethod
-    async def pytorch_inference(self):
-        pass
+    async def pytorch_inference(
+        model_name: str,
+        message: str,
+        max_new_tokens: int = 256,
+        history: Optional[List[Dict[str, str]]] = None,
+        conversation_id: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> ChatResponse:
+        from core.model_manager import model_manager
+        from routers.model import acquire_draft_model, acquire_model_async, chat_with_model
+
+        # Leased so eviction can't free the weights while this request is generating
+        with span("model_load"):
+            entry = await acquire_model_async(model_name)
+        draft = None
+        try:
+            draft = await asyncio.to_thread(acquire_draft_model, model_name, entry.tokenizer)
+            async with scheduler.slot(priority):
+                with span("generation"):
+                    response_text = await asyncio.to_thread(
+                        chat_with_model, entry.model, entry.tokenizer, message, max_new_tokens, history, conversation_id,
+                        draft.model if draft else None
+                    )
+        finally:
+            model_manager.release(entry)
+            if draft is not None:
+                model_manager.release(draft)
+        return ChatResponse(response={"response": response_text})
 
     @staticmethod
     async def api_inference(
@@ -20,10 +50,15 @@ class InferenceEngine:
         temperature: float = 0.7,
         max_new_tokens: int = 256,
         max_context_tokens: int = 2000,
-        min_similarity: float = 0.25
+        min_similarity: float = 0.25,
+        history: Optional[List[Dict[str, str]]] = None,
+        context: Optional[RequestContext] = None,
+        prepared: Optional[Dict[str, Any]] = None,
+        priority: Priority = Priority.INTERACTIVE
     ) -> Dict[str, Any]:        
+        context = context or retriever.new_context(message)
         enhanced_message, retrieval_metadata = await retriever.generate_intelligent_prompt(
-            message, max_context_tokens, min_similarity
+            message, max_context_tokens, min_similarity, context, prepared
         )
         
         # Log what sources were used for debugging/monitoring
@@ -39,10 +74,13 @@ class InferenceEngine:
             "temperature": temperature,
             "do_sample": True,
             "num_beams": 4,
-            "history": []
+            "history": history or []
         }
 
-        response = requests.post(f"{settings.TENSORLINK_HTTPS_SERVER}/generate", json=payload)
+        async with scheduler.slot(priority):
+            with span("generation"):
+                context.count("model_calls")
+                response = await hedged_requester.post("/generate", payload)
 
         if response.status_code != 200:
             raise HTTPException(
@@ -53,8 +91,9 @@ class InferenceEngine:
         try:
             response_data = response.json()
         except requests.exceptions.JSONDecodeError:
-            response_data = {"response": response_data.text}
+            response_data = {"response": response.text}
         
-        return ChatResponse(response=response_data)
+        retrieval_metadata["counters"] = context.summary()
+        return ChatResponse(response=response_data, metadata={"retrieval": retrieval_metadata})
             
 inference_engine = InferenceEngine()
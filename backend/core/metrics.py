@@ -0,0 +1,165 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition model."""
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.setdefault(label_values, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                labels = _format_labels(self.label_names, label_values)
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{_format_labels(self.label_names, label_values, ("le", repr(bound)))} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, label_values, ("le", "+Inf"))} {series["count"]}')
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Monotonically increasing count."""
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, label_names, **kwargs))
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, label_names))
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "localhostgpt_stage_seconds", "Time spent in each stage of the chat pipeline.", ("stage",)
+)
+request_seconds = registry.histogram(
+    "localhostgpt_request_seconds", "End-to-end chat request latency.", ("endpoint", "status")
+)
+upstream_seconds = registry.histogram(
+    "localhostgpt_upstream_seconds", "Latency of individual Tensorlink requests.", ("server",)
+)
+queue_seconds = registry.histogram(
+    "localhostgpt_queue_seconds", "Time model calls waited for a scheduler slot.", ("priority",)
+)
+shed_total = registry.counter(
+    "localhostgpt_shed_total", "Model calls rejected by the scheduler.", ("priority",)
+)
+hedges_total = registry.counter(
+    "localhostgpt_hedges_total", "Duplicate Tensorlink requests sent after the hedge delay.", ()
+)
+
+
+class Trace:
+    """Spans recorded while handling one request."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict] = []
+
+    def summary(self) -> Dict:
+        stages: Dict[str, float] = {}
+        for span in self.spans:
+            stages[span["stage"]] = stages.get(span["stage"], 0.0) + span["seconds"]
+
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+            "spans": [
+                {"stage": span["stage"], "start_ms": round(span["offset"] * 1000, 2), "duration_ms": round(span["seconds"] * 1000, 2)}
+                for span in self.spans
+            ]
+        }
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def trace_scope(endpoint: str):
+    """Collect spans for everything run inside the block and time the request."""
+    trace = Trace()
+    token = _trace.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        _trace.reset(token)
+        request_seconds.observe(time.perf_counter() - trace.start, endpoint, status)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage, adding it to the current trace if there is one."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage)
+
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append({"stage": stage, "offset": start - trace.start, "seconds": seconds})
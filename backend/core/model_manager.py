@@ -0,0 +1,325 @@
+import asyncio
+import gc
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from core.shared_state import shared_state
+
+
+class LoadedModel:
+    """A model resident in memory along with its bookkeeping."""
+    def __init__(self, name: str, tokenizer: Any, model: Any, device: str, load_mode: str, memory_bytes: int, load_seconds: float):
+        self.name = name
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.load_mode = load_mode
+        self.memory_bytes = memory_bytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        # Callers currently using the weights; an evicted model is freed when the last one returns
+        self.leases = 0
+        self.evicted = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.name,
+            "device": self.device,
+            "load_mode": self.load_mode,
+            "memory_mb": round(self.memory_bytes / (1024 ** 2), 1),
+            "load_seconds": round(self.load_seconds, 2),
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat(),
+            "last_used": datetime.fromtimestamp(self.last_used).isoformat()
+        }
+
+
+class ModelManager:
+    """
+    Keeps local models in memory under a RAM budget.
+
+    Models are evicted least-recently-used first once the budget is exceeded, and
+    concurrent requests for a model that is still loading wait on the same load
+    instead of starting their own. Fine-tuned LoRA adapters are registered
+    under their own model name and load as their base model with the adapter
+    merged in.
+
+    Callers that generate with a model hold a lease on it (lease() or
+    acquire()/release()) for as long as they use it. Evicting a leased model
+    takes it out of the cache straight away, but its weights are only freed
+    once the last lease is returned.
+    """
+    def __init__(self, memory_budget_mb: int = settings.MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget = memory_budget_mb * 1024 ** 2
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str) -> Tuple[Any, Any]:
+        """
+        Return (tokenizer, model), loading the model if it isn't resident.
+
+        Nothing stops the model being evicted afterwards; hold a lease instead
+        while generating with it.
+        """
+        with self.lease(model_name) as (tokenizer, model):
+            return tokenizer, model
+
+    async def get_async(self, model_name: str) -> Tuple[Any, Any]:
+        """Load or fetch a model without blocking the event loop."""
+        return await asyncio.to_thread(self.get, model_name)
+
+    @contextmanager
+    def lease(self, model_name: str) -> Iterator[Tuple[Any, Any]]:
+        """(tokenizer, model), kept in memory until the block exits."""
+        entry = self.acquire(model_name)
+        try:
+            yield entry.tokenizer, entry.model
+        finally:
+            self.release(entry)
+
+    def acquire(self, model_name: str) -> LoadedModel:
+        """Lease a model, loading it if it isn't resident. Pair with release()."""
+        while True:
+            with self._lock:
+                entry = self._models.get(model_name)
+                if entry is not None:
+                    self._models.move_to_end(model_name)
+                    entry.last_used = time.time()
+                    entry.leases += 1
+                    return entry
+
+                future = self._loading.get(model_name)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._loading[model_name] = future
+
+            if owner:
+                try:
+                    entry = self._load(model_name)
+                    future.set_result(entry)
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    with self._lock:
+                        self._loading.pop(model_name, None)
+
+            entry = future.result()
+            with self._lock:
+                # Otherwise it was evicted and freed before we got to it; load it again
+                if entry.model is not None:
+                    entry.leases += 1
+                    return entry
+
+    def release(self, entry: LoadedModel):
+        """Return a lease; frees the weights if the model was evicted meanwhile and this was the last one."""
+        with self._lock:
+            entry.leases -= 1
+            freed = self._drop([entry]) if entry.evicted else []
+        self._collect(freed)
+
+    def preload(self, model_names: Optional[List[str]] = None, wait: bool = False):
+        """Load models in background threads so the first request doesn't pay for it."""
+        model_names = model_names if model_names is not None else settings.PRELOAD_MODELS
+        drafts = [settings.DRAFT_MODELS[name] for name in model_names if name in settings.DRAFT_MODELS]
+
+        threads = [
+            threading.Thread(target=self._preload_one, args=(model_name,), daemon=True)
+            for model_name in dict.fromkeys(model_names + drafts)
+        ]
+        for thread in threads:
+            thread.start()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def unload(self, model_name: str) -> bool:
+        """Drop a model from memory. Returns False if it wasn't loaded."""
+        with self._lock:
+            entry = self._models.pop(model_name, None)
+            if entry is None:
+                return False
+            freed = self._drop([entry])
+
+        self._collect(freed)
+        return True
+
+    def register_adapter(self, name: str, base_model: str, path: str, preload: bool = False):
+        """Make a trained adapter loadable as model name, in every worker."""
+        adapter = {"base_model": base_model, "path": path, "created_at": time.time()}
+        shared_state.update("adapters", lambda adapters: {**adapters, name: adapter}, default={})
+        if preload:
+            self.preload([name])
+
+    def adapters(self) -> Dict[str, Dict[str, Any]]:
+        return shared_state.get("adapters", {})
+
+    def list_loaded(self) -> List[Dict[str, Any]]:
+        """Loaded models, most recently used first."""
+        with self._lock:
+            return [entry.to_dict() for entry in reversed(self._models.values())]
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return sum(entry.memory_bytes for entry in self._models.values())
+
+    def _preload_one(self, model_name: str):
+        try:
+            print(f"Preloading model {model_name}...")
+            self.get(model_name)
+        except Exception as e:
+            print(f"Error preloading model {model_name}: {e}")
+
+    def _load(self, model_name: str) -> LoadedModel:
+        import torch
+        from transformers import AutoTokenizer
+
+        adapter = self.adapters().get(model_name)
+        base_model = adapter["base_model"] if adapter else model_name
+        load_mode = settings.MODEL_LOAD_MODES.get(model_name, settings.MODEL_LOAD_MODES.get(base_model, settings.DEFAULT_DTYPE))
+        device = "cuda" if torch.cuda.is_available() and load_mode != "int8" else "cpu"
+        start = time.perf_counter()
+
+        tokenizer = AutoTokenizer.from_pretrained(base_model)
+        model = load_causal_lm(base_model, load_mode, device, adapter["path"] if adapter else None)
+        if adapter:
+            # Generation metrics and the prefix cache key on this; keep it apart from the base model's
+            model.name_or_path = model_name
+
+        entry = LoadedModel(
+            name=model_name,
+            tokenizer=tokenizer,
+            model=model,
+            device=device,
+            load_mode=load_mode,
+            memory_bytes=self._estimate_memory(model),
+            load_seconds=time.perf_counter() - start
+        )
+
+        with self._lock:
+            freed = self._drop(self._evict_for(entry.memory_bytes))
+            self._models[model_name] = entry
+
+        self._collect(freed)
+        return entry
+
+    def _evict_for(self, required_bytes: int) -> List[LoadedModel]:
+        """Pop least-recently-used models until required_bytes fits. Caller holds the lock."""
+        evicted = []
+        used = sum(entry.memory_bytes for entry in self._models.values())
+
+        while self._models and used + required_bytes > self.memory_budget:
+            _, entry = self._models.popitem(last=False)
+            used -= entry.memory_bytes
+            evicted.append(entry)
+
+        if required_bytes > self.memory_budget:
+            print(f"Warning: model needs {required_bytes / 1024 ** 2:.0f}MB, over the {self.memory_budget / 1024 ** 2:.0f}MB budget")
+
+        return evicted
+
+    @staticmethod
+    def _drop(entries: List[LoadedModel]) -> List[LoadedModel]:
+        """
+        Mark models evicted and let go of the weights of those nobody is
+        using. Caller holds the lock. Returns the ones let go of.
+        """
+        freed = []
+        for entry in entries:
+            if not entry.evicted:
+                entry.evicted = True
+                print(f"Evicting model {entry.name} ({entry.memory_bytes / 1024 ** 2:.0f}MB)")
+            if entry.leases == 0 and entry.model is not None:
+                entry.model = None
+                entry.tokenizer = None
+                freed.append(entry)
+        return freed
+
+    @staticmethod
+    def _collect(freed: List[LoadedModel]):
+        """Reclaim the memory of models _drop let go of."""
+        if not freed:
+            return
+
+        freed.clear()
+        gc.collect()
+
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @staticmethod
+    def _estimate_memory(model) -> int:
+        """Bytes held by a model's parameters, buffers and packed quantized weights."""
+        total = 0
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+
+        for module in model.modules():
+            if hasattr(module, "_packed_params"):
+                weight, bias = module._packed_params._weight_bias()
+                total += weight.numel() * weight.element_size()
+                if bias is not None:
+                    total += bias.numel() * bias.element_size()
+        return total
+
+
+# Load mode -> torch dtype the weights are materialized in
+LOAD_MODES = {
+    "float32": "float32",
+    "float16": "float16",
+    "bfloat16": "bfloat16",
+    "int8": "float32"
+}
+
+
+def load_causal_lm(model_name: str, load_mode: str, device: str, adapter_path: Optional[str] = None):
+    """
+    Load a causal LM in the given mode.
+
+    Weights are memory-mapped from safetensors where available and materialized
+    directly in the target dtype, rather than built in float32 and converted.
+    "int8" quantizes linear layers dynamically and only runs on CPU. A LoRA
+    adapter is merged into the weights before quantizing, so generation
+    costs the same as with the base model.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    if load_mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode {load_mode}, expected one of {list(LOAD_MODES)}")
+
+    if load_mode == "float16" and device == "cpu":
+        # Half precision matmuls are slow or missing on most CPUs, and bfloat16 is only
+        # fast with AVX512-BF16 or AMX; opt into it per model with MODEL_LOAD_MODES
+        load_mode = "float32"
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=getattr(torch, LOAD_MODES[load_mode]),
+        low_cpu_mem_usage=True
+    )
+
+    if adapter_path:
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, adapter_path).merge_and_unload()
+
+    if load_mode == "int8":
+        if device != "cpu":
+            raise ValueError("int8 dynamic quantization is only supported on CPU")
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = model.to(device)
+
+    model.eval()
+    return model
+
+
+model_manager = ModelManager()
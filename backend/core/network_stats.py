@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+from config.settings import settings
+
+DEFAULT_MODELS = [
+    {"id": "Qwen/Qwen2.5-7B-Instruct", "name": "Qwen2.5-7B", "requires_tensorlink": True},
+    {"id": "Qwen/Qwen3-8B-Instruct", "name": "Qwen3-8B", "requires_tensorlink": True},
+]
+
+
+class NetworkStatsService:
+    """
+    Tensorlink network stats, refreshed in the background.
+
+    Readers always get the last known good value immediately, with its age.
+    If it is older than stale_after a refresh is kicked off, but the reader
+    doesn't wait for it (stale-while-revalidate). A failed refresh, including
+    a non-200 response, leaves the last good value in place, marked stale
+    with the error.
+    """
+    def __init__(
+        self,
+        refresh_interval: float = settings.STATS_REFRESH_SECONDS,
+        stale_after: float = settings.STATS_STALE_SECONDS
+    ):
+        self.refresh_interval = refresh_interval
+        self.stale_after = stale_after
+        self._status_code: Optional[int] = None
+        self._data: Any = None
+        self._models: List[Dict[str, Any]] = DEFAULT_MODELS
+        self._fetched_at: Optional[float] = None
+        self._attempted_at: Optional[float] = None
+        self._error: Optional[str] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Begin periodic refreshes. Must be called from the running event loop."""
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The last known stats, never blocking on the network."""
+        now = time.time()
+        age = None if self._fetched_at is None else now - self._fetched_at
+        stale = age is None or age > self.stale_after or self._error is not None
+        # After a failure, retry at most every stale_after rather than on every read
+        if stale and (self._attempted_at is None or now - self._attempted_at > self.stale_after):
+            self._revalidate()
+
+        return {
+            "status_code": self._status_code,
+            "data": self._data,
+            "fetched_at": self._fetched_at,
+            "age_seconds": None if age is None else round(age, 3),
+            "stale": stale,
+            "error": self._error
+        }
+
+    def models(self) -> List[Dict[str, Any]]:
+        """Models available on the network, falling back to the defaults until stats arrive."""
+        self.snapshot()
+        return self._models
+
+    async def refresh(self):
+        """Fetch stats now, sharing an in-flight fetch if there is one."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+        await asyncio.shield(self._refresh_task)
+
+    def _revalidate(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing network stats: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _fetch(self):
+        self._attempted_at = time.time()
+        try:
+            response = await asyncio.to_thread(
+                requests.get, f"{settings.TENSORLINK_HTTPS_SERVER}/stats", timeout=settings.STATS_TIMEOUT_SECONDS
+            )
+            if response.status_code != 200:
+                # Keep serving the last good value
+                self._error = f"Stats request returned {response.status_code}"
+                return
+            data = response.json()
+
+        except Exception as e:
+            # Keep serving the last good value
+            self._error = str(e)
+            return
+
+        self._status_code = response.status_code
+        self._data = data
+        self._fetched_at = time.time()
+        self._error = None
+        self._models = self._derive_models(data)
+
+    @staticmethod
+    def _derive_models(data: Any) -> List[Dict[str, Any]]:
+        """Model list from a stats payload, accepting plain ids or {id, name} entries."""
+        entries = data.get("models") if isinstance(data, dict) else None
+        if not entries:
+            return DEFAULT_MODELS
+
+        if isinstance(entries, dict):
+            entries = list(entries.keys())
+
+        models = []
+        for entry in entries:
+            if isinstance(entry, str):
+                models.append({"id": entry, "name": entry.split("/")[-1], "requires_tensorlink": True})
+            elif isinstance(entry, dict) and (entry.get("id") or entry.get("hf_name")):
+                model_id = entry.get("id") or entry.get("hf_name")
+                models.append({
+                    "id": model_id,
+                    "name": entry.get("name", model_id.split("/")[-1]),
+                    "requires_tensorlink": entry.get("requires_tensorlink", True)
+                })
+
+        return models or DEFAULT_MODELS
+
+
+network_stats = NetworkStatsService()
@@ -0,0 +1,179 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import settings
+from core.request_context import RequestContext
+from core.request_policy import DeadlineExceeded, deadline_scope, remaining_time
+from core.retriever import retriever
+from core.scheduler import scheduler
+
+DRAFT_NOISE = re.compile(r"[\s.,!?;:]+")
+
+
+class PrefetchEntry:
+    def __init__(self, client_key: str, key: str, context: RequestContext):
+        self.client_key = client_key
+        self.key = key
+        self.context = context
+        self.created = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+
+class Prefetcher:
+    """
+    Prepares the retrieval for a message while it is still being typed.
+
+    The renderer posts debounced drafts; each one is classified and its chat
+    history (and optionally web) candidates gathered into a short-lived
+    cache keyed by the client and the normalized draft. When the client sends
+    a message matching one of its drafts exactly or nearly, the chat request
+    picks up that work instead of repeating it, waiting for it if it's still
+    running.
+
+    Drafts are speculative, so they're cheap to refuse: a client's newer
+    draft abandons its older in-flight one, only max_inflight run at once,
+    none start while the scheduler is saturated, and entries expire after
+    ttl seconds. Retrieval runs in worker threads that can't be interrupted,
+    so abandoned work isn't cancelled; it keeps its in-flight slot until it
+    finishes, which its ttl deadline bounds. The cache is per worker process.
+    """
+    def __init__(
+        self,
+        ttl: float = settings.PREFETCH_TTL_SECONDS,
+        max_entries: int = settings.PREFETCH_MAX_ENTRIES,
+        max_inflight: int = settings.PREFETCH_MAX_INFLIGHT,
+        min_chars: int = settings.PREFETCH_MIN_CHARS,
+        match_ratio: float = settings.PREFETCH_MATCH_RATIO
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_inflight = max_inflight
+        self.min_chars = min_chars
+        self.match_ratio = match_ratio
+        self._entries: "OrderedDict[Tuple[str, str], PrefetchEntry]" = OrderedDict()
+        # Client -> key of the draft most recently prefetched for it
+        self._latest: Dict[str, str] = {}
+        # Drafts being warmed, including abandoned ones still running
+        self._inflight = 0
+        self.stats = {"scheduled": 0, "cached": 0, "skipped": 0, "superseded": 0, "hits": 0, "misses": 0}
+
+    def schedule(
+        self,
+        draft: str,
+        client_key: str,
+        include_web: bool = settings.PREFETCH_WEB,
+        min_similarity: float = 0.25
+    ) -> Dict[str, Any]:
+        """Start preparing draft in the background, unless it's cached or a limit says no."""
+        key = normalize_draft(draft)
+        if len(key) < self.min_chars:
+            return self._result("skipped", "too short")
+
+        self._expire()
+        if (client_key, key) in self._entries:
+            self._entries.move_to_end((client_key, key))
+            self._latest[client_key] = key
+            return self._result("cached")
+
+        if self._inflight >= self.max_inflight:
+            return self._result("skipped", "too many drafts in flight")
+        if scheduler.saturated():
+            return self._result("skipped", "server busy")
+
+        # The client has typed on; whatever it was warming is abandoned
+        previous = self._entries.get((client_key, self._latest.get(client_key)))
+        if previous is not None and not previous.task.done():
+            self._drop(previous)
+            self.stats["superseded"] += 1
+
+        entry = PrefetchEntry(client_key, key, retriever.new_context(draft))
+        self._inflight += 1
+        entry.task = asyncio.create_task(self._warm(entry, include_web, min_similarity))
+        self._entries[(client_key, key)] = entry
+        self._latest[client_key] = key
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries.values())))
+
+        return self._result("scheduled")
+
+    async def take(self, message: str, client_key: str) -> Optional[Tuple[RequestContext, Dict]]:
+        """
+        The prepared (context, result) for one of client_key's drafts matching
+        message, removed from the cache; None if nothing usable was prefetched.
+        """
+        self._expire()
+        entry = self._match(client_key, normalize_draft(message))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        self._drop(entry)
+        try:
+            prepared = await asyncio.wait_for(asyncio.shield(entry.task), remaining_time())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Deadline passed waiting for prefetched context")
+
+        if prepared is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry.context, prepared
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "in_flight": self._inflight,
+            "stats": self.stats
+        }
+
+    async def _warm(self, entry: PrefetchEntry, include_web: bool, min_similarity: float) -> Optional[Dict]:
+        try:
+            # An abandoned draft can't hold a scheduler slot past its own lifetime
+            with deadline_scope(self.ttl):
+                return await retriever.prepare_context(entry.context, min_similarity, include_web)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Prefetch error: {e}")
+            return None
+        finally:
+            self._inflight -= 1
+
+    def _match(self, client_key: str, key: str) -> Optional[PrefetchEntry]:
+        if (client_key, key) in self._entries:
+            return self._entries[(client_key, key)]
+
+        best, best_ratio = None, self.match_ratio
+        for entry in self._entries.values():
+            if entry.client_key != client_key:
+                continue
+            ratio = SequenceMatcher(None, key, entry.key).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = entry, ratio
+        return best
+
+    def _expire(self):
+        now = time.monotonic()
+        for entry in [entry for entry in self._entries.values() if now - entry.created > self.ttl]:
+            self._drop(entry)
+        self._latest = {client: key for client, key in self._latest.items() if (client, key) in self._entries}
+
+    def _drop(self, entry: PrefetchEntry):
+        """Remove entry from the cache; if it's still warming, it runs out in the background."""
+        self._entries.pop((entry.client_key, entry.key), None)
+
+    def _result(self, status: str, reason: Optional[str] = None) -> Dict[str, Any]:
+        self.stats[status] += 1
+        return {"status": status, "reason": reason} if reason else {"status": status}
+
+
+def normalize_draft(text: str) -> str:
+    """Lowercased, with whitespace and punctuation runs collapsed, so trivial edits map to one key."""
+    return DRAFT_NOISE.sub(" ", text.lower()).strip()
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    import torch
+    from transformers import DynamicCache
+
+
+class PrefixCache:
+    """
+    Per-conversation past-key-values for local generation.
+
+    Each entry holds the token ids a conversation's KV cache covers, so the next
+    turn only has to run the model over tokens past the longest common prefix.
+    Entries are evicted least-recently-used once max_mb is exceeded and, if a
+    spill directory is configured, written to disk instead of being discarded.
+    """
+    def __init__(
+        self,
+        max_mb: int = settings.PREFIX_CACHE_MAX_MB,
+        spill_dir: str = settings.PREFIX_CACHE_SPILL_DIR,
+        spill_max_mb: int = settings.PREFIX_CACHE_SPILL_MAX_MB
+    ):
+        self.max_bytes = max_mb * 1024 ** 2
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_mb * 1024 ** 2
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Keys written to the spill directory, whose file names are hashes
+        self._spilled: set = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "reused_tokens": 0, "evictions": 0, "spills": 0}
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    def generate(self, model, input_ids: "torch.Tensor", conversation_id: str, model_name: str, **generate_kwargs) -> Tuple["torch.Tensor", int]:
+        """
+        Run model.generate, resuming from the conversation's cached prefix.
+
+        Returns:
+            Tuple of (output sequences, number of prompt tokens served from cache)
+        """
+        from transformers import DynamicCache
+
+        key = self._key(conversation_id, model_name)
+        past_key_values, reused = self._take_prefix(key, input_ids[0].tolist())
+
+        outputs = model.generate(
+            input_ids,
+            past_key_values=past_key_values,
+            use_cache=True,
+            return_dict_in_generate=True,
+            **generate_kwargs
+        )
+
+        cache = outputs.past_key_values
+        if isinstance(cache, tuple):
+            cache = DynamicCache.from_legacy_cache(cache)
+
+        if cache is not None:
+            # The cache trails the sequence by the last sampled token
+            cached_length = cache.get_seq_length()
+            self.put(key, outputs.sequences[0][:cached_length].tolist(), cache)
+
+        return outputs.sequences, reused
+
+    def put(self, key: str, token_ids: List[int], cache: "DynamicCache"):
+        entry = {"token_ids": token_ids, "cache": cache, "bytes": self._cache_bytes(cache), "last_used": time.time()}
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            evicted = self._evict()
+
+        for evicted_key, evicted_entry in evicted:
+            self._spill(evicted_key, evicted_entry)
+
+    def drop(self, conversation_id: str, model_name: Optional[str] = None):
+        """Forget a conversation's cached prefix for one model, or for every model when none is given."""
+        with self._lock:
+            if model_name is None:
+                suffix = self._key(conversation_id, "")
+                keys = [key for key in {*self._entries, *self._spilled} if key.endswith(suffix)]
+            else:
+                keys = [self._key(conversation_id, model_name)]
+            for key in keys:
+                self._entries.pop(key, None)
+                self._spilled.discard(key)
+
+        for key in keys:
+            path = self._spill_path(key)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_mb": round(sum(e["bytes"] for e in self._entries.values()) / 1024 ** 2, 1),
+                **self.stats
+            }
+
+    def _take_prefix(self, key: str, token_ids: List[int]) -> Tuple[Optional["DynamicCache"], int]:
+        """Remove the cached entry for key and crop it to the prefix shared with token_ids."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+        if entry is None:
+            entry = self._load_spilled(key)
+
+        if entry is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None, 0
+
+        reused = 0
+        for cached_id, token_id in zip(entry["token_ids"], token_ids):
+            if cached_id != token_id:
+                break
+            reused += 1
+
+        # generate needs at least one uncached token to produce logits from
+        reused = min(reused, len(token_ids) - 1)
+        if reused <= 0:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None, 0
+
+        cache = entry["cache"]
+        cache.crop(reused)
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["reused_tokens"] += reused
+        return cache, reused
+
+    def _evict(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Pop least-recently-used entries until under budget. Caller holds the lock."""
+        evicted = []
+        used = sum(e["bytes"] for e in self._entries.values())
+
+        while len(self._entries) > 1 and used > self.max_bytes:
+            key, entry = self._entries.popitem(last=False)
+            used -= entry["bytes"]
+            evicted.append((key, entry))
+            self.stats["evictions"] += 1
+
+        return evicted
+
+    def _spill(self, key: str, entry: Dict[str, Any]):
+        path = self._spill_path(key)
+        if not path:
+            return
+
+        try:
+            import torch
+            legacy = tuple((k.cpu(), v.cpu()) for k, v in entry["cache"].to_legacy_cache())
+            torch.save({"token_ids": entry["token_ids"], "past_key_values": legacy}, path)
+            with self._lock:
+                self.stats["spills"] += 1
+                self._spilled.add(key)
+            self._trim_spill_dir()
+        except Exception as e:
+            print(f"Error spilling prefix cache to disk: {e}")
+
+    def _load_spilled(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._spill_path(key)
+        if not path or not os.path.exists(path):
+            return None
+
+        try:
+            import torch
+            from transformers import DynamicCache
+            data = torch.load(path, weights_only=True)
+            return {"token_ids": data["token_ids"], "cache": DynamicCache.from_legacy_cache(data["past_key_values"])}
+        except Exception as e:
+            print(f"Error loading spilled prefix cache: {e}")
+            return None
+        finally:
+            os.remove(path)
+            with self._lock:
+                self._spilled.discard(key)
+
+    def _trim_spill_dir(self):
+        """Delete the oldest spilled entries once the directory exceeds its budget."""
+        files = [os.path.join(self.spill_dir, f) for f in os.listdir(self.spill_dir) if f.endswith(".pt")]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(f) for f in files)
+
+        while files and total > self.spill_max_bytes:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+
+    def _spill_path(self, key: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, hashlib.sha1(key.encode()).hexdigest() + ".pt")
+
+    @staticmethod
+    def _key(conversation_id: str, model_name: str) -> str:
+        return f"{model_name}::{conversation_id}"
+
+    @staticmethod
+    def _cache_bytes(cache: "DynamicCache") -> int:
+        return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in cache.to_legacy_cache())
+
+
+prefix_cache = PrefixCache()
@@ -0,0 +1,139 @@
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Leaf functions of threads parked waiting for work (event loop, thread pools)
+IDLE_FUNCTIONS = {"select", "wait", "poll", "_worker"}
+
+
+class ProfileSession:
+    """Stack samples collected by one profiling run."""
+    def __init__(self, interval: float, chat_requests: int = 0, include_idle: bool = False):
+        self.interval = interval
+        self.chat_requests = chat_requests
+        self.include_idle = include_idle
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.started_at = time.time()
+        self.finished = threading.Event()
+
+    def collapsed(self) -> str:
+        """Samples in the collapsed-stack format read by flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]))
+
+    def top_functions(self, n: int = 20) -> List[Dict[str, Any]]:
+        self_counts: Dict[str, int] = {}
+        total_counts: Dict[str, int] = {}
+
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] = self_counts.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total_counts[frame] = total_counts.get(frame, 0) + count
+
+        ranked = sorted(total_counts, key=lambda frame: (-self_counts.get(frame, 0), -total_counts[frame]))[:n]
+        return [
+            {
+                "function": frame,
+                "self_samples": self_counts.get(frame, 0),
+                "total_samples": total_counts[frame],
+                "self_percent": round(100 * self_counts.get(frame, 0) / max(self.samples, 1), 2),
+                "total_percent": round(100 * total_counts[frame] / max(self.samples, 1), 2)
+            }
+            for frame in ranked
+        ]
+
+    def result(self, top: int = 20) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "duration_seconds": round(time.time() - self.started_at, 2),
+            "top_functions": self.top_functions(top),
+            "collapsed": self.collapsed()
+        }
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the running process.
+
+    A background thread periodically walks the stacks of every other thread,
+    so it works on a live server without restarting it under a profiler. A
+    session can either sample for a fixed time, or sample only while the next
+    N chat requests are in flight.
+    """
+    def __init__(self):
+        self._session: Optional[ProfileSession] = None
+        self._active_requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._session is not None
+
+    def start(self, seconds: Optional[float], interval: float, chat_requests: int = 0, include_idle: bool = False) -> ProfileSession:
+        """Start a session; it ends after seconds, or once chat_requests requests have finished."""
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError("A profiling session is already running")
+            session = ProfileSession(interval, chat_requests, include_idle)
+            self._session = session
+
+        deadline = time.monotonic() + seconds if seconds else None
+        threading.Thread(target=self._run, args=(session, deadline), daemon=True, name="sampling-profiler").start()
+        return session
+
+    def request_started(self):
+        with self._lock:
+            if self._session is not None and self._session.chat_requests:
+                self._active_requests += 1
+
+    def request_finished(self):
+        with self._lock:
+            session = self._session
+            if session is None or not session.chat_requests or self._active_requests == 0:
+                return
+            self._active_requests -= 1
+            session.chat_requests -= 1
+            if session.chat_requests == 0:
+                session.finished.set()
+
+    def _run(self, session: ProfileSession, deadline: Optional[float]):
+        own_thread = threading.get_ident()
+        per_request = session.chat_requests > 0
+
+        try:
+            while not session.finished.is_set():
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+
+                if not per_request or self._active_requests > 0:
+                    for thread_id, frame in sys._current_frames().items():
+                        if thread_id != own_thread:
+                            self._record(session, frame)
+
+                time.sleep(session.interval)
+        finally:
+            with self._lock:
+                self._session = None
+                self._active_requests = 0
+            session.finished.set()
+
+    @staticmethod
+    def _record(session: ProfileSession, frame):
+        if not session.include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+            return
+
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        stack = ";".join(reversed(frames))
+        session.stacks[stack] = session.stacks.get(stack, 0) + 1
+        session.samples += 1
+
+
+profiler = SamplingProfiler()
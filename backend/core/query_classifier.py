@@ -1,9 +1,11 @@
 import json
-from typing import Dict
+from typing import Dict, Optional
 
-import requests
 from config.prompts import classification_prompt
 from config.settings import settings
+from core.request_context import RequestContext
+from core.request_policy import DeadlineExceeded, hedged_requester
+from core.scheduler import Priority, scheduler
 
 
 class QueryClassifier:
@@ -12,7 +14,7 @@ class QueryClassifier:
     def __init__(self, model_name: str = "Qwen/Qwen2.5-7B-Instruct"):
         self.model_name = model_name
     
-    async def classify_query(self, query: str) -> Dict[str, bool]:
+    async def classify_query(self, query: str, context: Optional[RequestContext] = None) -> Dict[str, bool]:
         """
         Use the model to determine what information sources are needed.
         
@@ -33,7 +35,13 @@ class QueryClassifier:
                 "history": []
             }
 
-            response = requests.post(f"{settings.TENSORLINK_HTTPS_SERVER}/generate", json=payload)
+            # Shed classifications fall through to the rule-based fallback
+            async with scheduler.slot(Priority.BACKGROUND):
+                if context is not None:
+                    context.count("model_calls")
+                response = await hedged_requester.post(
+                    "/generate", payload, timeout=settings.CLASSIFICATION_TIMEOUT_SECONDS, kind="classification"
+                )
             
             if response.status_code == 200:
                 response_data = response.json()
@@ -57,6 +65,8 @@ class QueryClassifier:
                 # Fallback: simple keyword detection if JSON parsing fails
                 return self._fallback_classification(query, response_text)
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Classification error: {e}")
         
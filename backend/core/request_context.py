@@ -0,0 +1,68 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class RequestContext:
+    """
+    Per-request memo shared by every stage of the chat pipeline.
+
+    The query embedding and token counts are computed once, however many
+    stages ask for them. Counters record the model calls, embeddings and
+    tokenizations the request actually performed and are returned in the
+    response metadata.
+    """
+    def __init__(self, query: str, embeddings_provider: Callable[[], Any], encoding_provider: Callable[[], Any]):
+        self.query = query
+        self.normalized_query = WHITESPACE.sub(" ", query).strip()
+        self._embeddings_provider = embeddings_provider
+        self._encoding_provider = encoding_provider
+        self._query_embedding: Optional[List[float]] = None
+        self._token_counts: Dict[str, int] = {}
+        self.counters = {
+            "model_calls": 0,
+            "embedding_calls": 0,
+            "texts_embedded": 0,
+            "tokenizations": 0,
+            "token_cache_hits": 0
+        }
+
+    @property
+    def query_embedding(self) -> List[float]:
+        if self._query_embedding is None:
+            self._query_embedding = self.embed_query(self.normalized_query)
+        return self._query_embedding
+
+    @property
+    def embeddings(self) -> "RequestContext":
+        """This context, standing in for the embeddings object so calls through it are counted."""
+        return self
+
+    def embed_query(self, text: str) -> List[float]:
+        if text == self.normalized_query and self._query_embedding is not None:
+            return self._query_embedding
+        self.count("embedding_calls")
+        self.count("texts_embedded")
+        return self._embeddings_provider().embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.count("embedding_calls")
+        self.count("texts_embedded", len(texts))
+        return self._embeddings_provider().embed_documents(texts)
+
+    def count_tokens(self, text: str) -> int:
+        tokens = self._token_counts.get(text)
+        if tokens is None:
+            tokens = len(self._encoding_provider().encode(text))
+            self._token_counts[text] = tokens
+            self.count("tokenizations")
+        else:
+            self.count("token_cache_hits")
+        return tokens
+
+    def count(self, counter: str, n: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def summary(self) -> Dict[str, int]:
+        return dict(self.counters)
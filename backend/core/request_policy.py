@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import requests
+from config.settings import settings
+from core.metrics import hedges_total, upstream_seconds
+
+# Absolute time.monotonic() by which the current request must finish
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of its end-to-end time budget."""
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Give everything awaited inside the block a shared time budget."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there isn't one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Linearly interpolated percentile, matching numpy's default."""
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class LatencyTracker:
+    """Rolling window of request latencies per endpoint (server and call kind)."""
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, endpoint: str, p: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples.get(endpoint, ()))
+        if len(samples) < min_samples:
+            return None
+        return percentile(samples, p)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+
+        return {
+            endpoint: {
+                "count": len(samples),
+                "p50": round(percentile(samples, 50), 4),
+                "p95": round(percentile(samples, 95), 4),
+                "p99": round(percentile(samples, 99), 4)
+            }
+            for endpoint, samples in snapshot.items() if samples
+        }
+
+
+class HedgedRequester:
+    """
+    POSTs to Tensorlink with a deadline and hedging.
+
+    The first attempt goes to the primary server. If it hasn't answered by the
+    primary's observed latency percentile, a duplicate is sent to the next
+    server; the first successful response wins and the others are abandoned.
+    Failed attempts fail over immediately.
+
+    Latencies are tracked per server and per kind of call, since a short
+    classification and a long generation hit the same path. Abandoned
+    attempts record how long they ran too, so the slow tail that hedging
+    cuts off still counts towards the percentile.
+    """
+    def __init__(
+        self,
+        servers: Optional[List[str]] = None,
+        hedge_percentile: float = settings.HEDGE_PERCENTILE,
+        max_hedges: int = settings.MAX_HEDGES,
+        tracker: Optional[LatencyTracker] = None
+    ):
+        self.servers = servers or [settings.TENSORLINK_HTTPS_SERVER, *settings.TENSORLINK_HEDGE_SERVERS]
+        self.hedge_percentile = hedge_percentile
+        self.max_hedges = max_hedges
+        self.tracker = tracker or LatencyTracker()
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "deadline_exceeded": 0}
+
+    def hedge_delay(self, kind: str = "generation") -> float:
+        """How long to wait on the primary before sending a duplicate of a kind call."""
+        observed = self.tracker.percentile(endpoint_key(self.servers[0], kind), self.hedge_percentile, settings.HEDGE_MIN_SAMPLES)
+        if observed is None:
+            return settings.HEDGE_DEFAULT_DELAY_SECONDS
+        return max(observed, settings.HEDGE_MIN_DELAY_SECONDS)
+
+    async def post(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        kind: str = "generation"
+    ) -> requests.Response:
+        """
+        POST payload to path on the configured servers. kind names the sort
+        of call (generation, classification, summary) for latency tracking.
+
+        The time budget is the tighter of timeout and the enclosing deadline_scope.
+        Any response below 500 counts as an answer; 5xx and connection errors
+        move on to the next server.
+        """
+        budget = remaining_time()
+        if timeout is not None:
+            budget = timeout if budget is None else min(budget, timeout)
+        if budget is None:
+            budget = settings.CHAT_DEADLINE_SECONDS
+        if budget <= 0:
+            self.stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"No time left to call {path}")
+
+        deadline = time.monotonic() + budget
+        self.stats["requests"] += 1
+
+        next_server = 0
+        attempts: Dict[asyncio.Task, str] = {}
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_server
+            server = self.servers[next_server]
+            next_server += 1
+            task = asyncio.create_task(self._attempt(server, path, payload, deadline - time.monotonic(), kind))
+            attempts[task] = server
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_delay(kind)
+
+        try:
+            while attempts:
+                now = time.monotonic()
+                can_hedge = next_server < len(self.servers) and next_server <= self.max_hedges
+                wake_at = min(deadline, hedge_at) if can_hedge else deadline
+
+                done, _ = await asyncio.wait(attempts, timeout=max(wake_at - now, 0), return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    server = attempts.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+
+                    if response.status_code < 500:
+                        if server != self.servers[0]:
+                            self.stats["hedge_wins"] += 1
+                        return response
+                    last_error = requests.HTTPError(f"{server} returned {response.status_code}", response=response)
+
+                if time.monotonic() >= deadline:
+                    break
+
+                if done and not attempts and next_server < len(self.servers):
+                    # Everything in flight failed, fail over straight away
+                    self.stats["failovers"] += 1
+                    launch()
+                elif not done and can_hedge and time.monotonic() >= hedge_at:
+                    self.stats["hedges"] += 1
+                    hedges_total.inc()
+                    launch()
+                    hedge_at = time.monotonic() + self.hedge_delay(kind)
+        finally:
+            for task in attempts:
+                task.cancel()
+
+        if time.monotonic() >= deadline:
+            self.stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"{path} did not complete within {budget:.1f}s")
+
+        raise last_error or requests.RequestException(f"All servers failed for {path}")
+
+    async def _attempt(self, server: str, path: str, payload: Dict[str, Any], timeout: float, kind: str) -> requests.Response:
+        # The worker thread can't be interrupted, so its own timeout bounds an abandoned attempt
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(requests.post, f"{server}{path}", json=payload, timeout=max(timeout, 0.01))
+        finally:
+            # Including abandoned attempts: at least this slow, and leaving them out would hide the tail
+            self._record(server, kind, time.perf_counter() - start)
+
+    def _record(self, server: str, kind: str, seconds: float):
+        self.tracker.record(endpoint_key(server, kind), seconds)
+        upstream_seconds.observe(seconds, server)
+
+
+def endpoint_key(server: str, kind: str) -> str:
+    return f"{kind} {server}"
+
+
+hedged_requester = HedgedRequester()
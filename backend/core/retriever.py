@@ -1,216 +1,277 @@
-import json
-import os
+import asyncio
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-import numpy as np
 import tiktoken
 from config.prompts import contextualize_prompt
+from config.settings import settings
+from core.chat_store import chat_store
+from core.context_packer import Candidate, context_packer
+from core.metrics import span
 from core.query_classifier import QueryClassifier
+from core.request_context import RequestContext
+from core.vector_index import INDEX_FORMAT_VERSION, SharedIndex, shard_name
+from core.web_passages import web_passages
 from core.web_scraper import WebScraper
-from langchain.embeddings.base import Embeddings
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from sentence_transformers import SentenceTransformer
 
+if TYPE_CHECKING:
+    import numpy as np
 
-class SentenceTransformerEmbeddings(Embeddings):
-    """Wrapper to make SentenceTransformer compatible with LangChain."""
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
-    
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of documents."""
-        embeddings = self.model.encode(texts, convert_to_tensor=False)
-        return embeddings.tolist()
-    
-    def embed_query(self, text: str) -> List[float]:
-        """Embed a single query."""
-        embedding = self.model.encode([text], convert_to_tensor=False)
-        return embedding[0].tolist()
+
+SOURCE_NAMES = {"chat": "chat_history", "web": "web_search"}
 
 
 class Retriever:
-    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2"):
-        self.embeddings = SentenceTransformerEmbeddings(embedding_model)
-        self.vectorstore = None
-        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=500,
-            chunk_overlap=50
+    def __init__(self, embedding_model: str = settings.EMBEDDING_MODEL):
+        self.embedding_model = embedding_model
+        self.index = SharedIndex(
+            settings.INDEX_DIR,
+            search_threads=settings.INDEX_SEARCH_THREADS,
+            grace_seconds=settings.INDEX_VERSION_GRACE_SECONDS
         )
-        self.encoding = tiktoken.get_encoding("cl100k_base")
+        self._embeddings = None
+        self._text_splitter = None
+        self._encoding = None
+        self._init_lock = threading.Lock()
+        self._index_lock = threading.Lock()
 
-        user_dir = os.path.expanduser("~")
-        self.chat_dir = os.path.join(user_dir, "localhostGPT")
+        self.chat_dir = settings.CHAT_DIR
 
         self.web_scraper = WebScraper()
         self.classifier = QueryClassifier()
+
+    @property
+    def embeddings(self):
+        """Sentence-transformer embeddings, loaded on first use."""
+        if self._embeddings is None:
+            with self._init_lock:
+                if self._embeddings is None:
+                    from core.embeddings import SentenceTransformerEmbeddings
+                    self._embeddings = SentenceTransformerEmbeddings(self.embedding_model)
+        return self._embeddings
+
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            with self._init_lock:
+                if self._text_splitter is None:
+                    from langchain.text_splitter import RecursiveCharacterTextSplitter
+                    self._text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                        chunk_size=settings.CHUNK_SIZE,
+                        chunk_overlap=settings.CHUNK_OVERLAP,
+                        # Lets the context packer merge overlapping neighbouring chunks
+                        add_start_index=True
+                    )
+        return self._text_splitter
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        return self._encoding
+
+    def warm(self):
+        """Load the embedding model, splitter and tokenizer ahead of the first request."""
+        self.embeddings
+        self.text_splitter
+        self.encoding
+    
+    def new_context(self, query: str) -> RequestContext:
+        """A request context that embeds and tokenizes with this retriever's models."""
+        return RequestContext(query, lambda: self.embeddings, lambda: self.encoding)
     
-    async def generate_intelligent_prompt(self, query: str, max_tokens: int = 2000, min_similarity: float = 0.25) -> tuple[str, Dict]:
+    async def generate_intelligent_prompt(
+        self,
+        query: str,
+        max_tokens: int = 2000,
+        min_similarity: float = 0.25,
+        context: Optional[RequestContext] = None,
+        prepared: Optional[Dict] = None
+    ) -> tuple[str, Dict]:
         """
         Generate an intelligently augmented prompt using model-based classification.
+
+        Args:
+            prepared: Classification and candidates from prepare_context, e.g.
+                warmed by the prefetcher while the message was being typed
         
         Returns:
             Tuple of (prompt, metadata)
         """
-        # Use the model to classify the query
-        classification = await self.classifier.classify_query(query)
+        context = context or self.new_context(query)
+        prefetched = prepared is not None
+        if prepared is None:
+            prepared = await self.prepare_context(context, min_similarity)
+        elif prepared["classification"]["needs_web_search"] and not prepared["web_searched"]:
+            # Web results are optional when prefetching; fetch them now if the query needs them
+            with span("web_context"):
+                prepared = {**prepared, "candidates": prepared["candidates"] + await self._web_candidates(context)}
+
+        classification = prepared["classification"]
+        candidates = prepared["candidates"]
         
         metadata = {
             "classification": classification,
             "sources_used": [],
-            "token_usage": 0
+            "token_usage": 0,
+            "prefetched": prefetched
         }
-        
-        context_parts = []
-        total_tokens = 0
 
-        # Get chat history if needed
-        if classification['needs_chat_history']:
-            chat_context = self._get_chat_context(query, max_tokens // 2 if classification['needs_web_search'] else max_tokens, min_similarity)
-            if chat_context:
-                context_parts.extend(chat_context["parts"])
-                total_tokens += chat_context["tokens"]
-                metadata["sources_used"].append("chat_history")
-        
-        # Get web search context if needed
-        if classification['needs_web_search']:
-            remaining_tokens = max_tokens - total_tokens
-            web_context = await self._get_web_context(query, remaining_tokens)
-            if web_context:
-                context_parts.extend(web_context["parts"])
-                total_tokens += web_context["tokens"]
-                metadata["sources_used"].append("web_search")
+        # Choose context from all sources under one budget
+        with span("context_packing"):
+            packed = context_packer.pack(candidates, max_tokens, context.count_tokens)
+        total_tokens = packed["tokens"]
+        metadata["sources_used"] = list(dict.fromkeys(SOURCE_NAMES[candidate.source] for candidate in packed["selected"]))
+        metadata["packing"] = packed["stats"]
         
         # Build final prompt
-        if context_parts:
-            context = "\n".join(context_parts)
-            prompt = contextualize_prompt(context, query)
-        else:
-            prompt = f"USER QUERY: {query}"
+        with span("prompt_assembly"):
+            if packed["selected"]:
+                context_text = "\n".join(candidate.render() for candidate in packed["selected"])
+                prompt = contextualize_prompt(context_text, query)
+            else:
+                prompt = f"USER QUERY: {query}"
         
         metadata["token_usage"] = total_tokens
+        metadata["counters"] = context.summary()
         return prompt, metadata
 
-    def _get_chat_context(self, query: str, max_tokens: int, min_similarity: float) -> Optional[Dict]:
-        """Get relevant chat history context."""
+    async def prepare_context(
+        self,
+        context: RequestContext,
+        min_similarity: float = 0.25,
+        include_web: bool = True
+    ) -> Dict:
+        """
+        Classify the query and gather candidates from the sources it needs.
+
+        Returns:
+            Dict with the classification, the candidates, and whether web
+            search was run
+        """
+        # Use the model to classify the query
+        with span("classification"):
+            classification = await self.classifier.classify_query(context.query, context)
+
+        candidates = []
+
+        # Get chat history if needed
+        if classification['needs_chat_history']:
+            with span("chat_retrieval"):
+                candidates.extend(await asyncio.to_thread(self._chat_candidates, context, min_similarity))
+        
+        # Get web search context if needed
+        web_searched = classification['needs_web_search'] and include_web
+        if web_searched:
+            with span("web_context"):
+                candidates.extend(await self._web_candidates(context))
+
+        return {"classification": classification, "candidates": candidates, "web_searched": web_searched}
+
+    def _chat_candidates(self, context: RequestContext, min_similarity: float) -> List[Candidate]:
+        """Chat history chunks similar enough to the query."""
         try:
-            relevant_results = self.search_relevant_history(query, k=5)
-            
-            if not relevant_results:
-                return None
-            
-            context_parts = []
-            total_tokens = 0
-            
-            for result in relevant_results:
-                if result["similarity_score"] < min_similarity:
-                    continue
-                
-                content_tokens = result["token_count"]
-                
-                if total_tokens + content_tokens <= max_tokens:
-                    metadata = result.get("metadata", {})
-                    context_header = f"[CHAT HISTORY | Similarity: {result['similarity_score']:.3f}"
-                    
-                    if "conversation_id" in metadata:
-                        context_header += f" | Chat: {metadata['conversation_id']}"
-                    if "last_updated" in metadata:
-                        try:
-                            dt = datetime.fromisoformat(metadata['last_updated'].replace('Z', '+00:00'))
-                            context_header += f" | Date: {dt.strftime('%Y-%m-%d')}"
-                        except:
-                            pass
-                    
-                    context_header += "]\n"
-                    context_parts.append(f"{context_header}{result['content'].strip()}\n---")
-                    total_tokens += content_tokens
-                else:
-                    break
-            
-            return {"parts": context_parts, "tokens": total_tokens} if context_parts else None
-            
+            relevant_results = self.search_relevant_history(context.query, k=settings.CONTEXT_CHAT_CANDIDATES, context=context)
         except Exception as e:
             print(f"Error getting chat context: {e}")
-            return None
+            return []
+
+        candidates = []
+        for result in relevant_results:
+            if result["similarity_score"] < min_similarity:
+                continue
+
+            metadata = result.get("metadata", {})
+            candidates.append(Candidate(
+                source="chat",
+                content=result["content"],
+                relevance=result.get("score", result["similarity_score"]),
+                header=lambda candidate, metadata=metadata: chat_header(candidate, metadata),
+                group=metadata.get("conversation_id"),
+                start=metadata.get("start_index")
+            ))
+        return candidates
     
-    async def _get_web_context(self, query: str, max_tokens: int) -> Optional[Dict]:
-        """Get relevant web search context."""
+    async def _web_candidates(self, context: RequestContext) -> List[Candidate]:
+        """The passages of the search results' pages that best match the query."""
         try:
-            search_results = self.web_scraper.search_duckduckgo(query, max_results=3)
-            
-            if not search_results:
-                return None
-            
-            context_parts = []
-            total_tokens = 0
-            
-            for result in search_results:
-                # Try to get more content from the URL
-                scraped_content = self.web_scraper.scrape_content(result['url'], max_chars=800)
-                content = scraped_content if scraped_content else result['snippet']
-                
-                content_tokens = self.num_tokens_from_string(content)
-                
-                if total_tokens + content_tokens <= max_tokens:
-                    context_header = f"[WEB SEARCH | Source: {result.get('source', 'web')} | URL: {result['url']}]\n"
-                    context_part = f"{context_header}Title: {result['title']}\nContent: {content}\n---"
-                    
-                    context_parts.append(context_part)
-                    total_tokens += content_tokens
-                else:
-                    break
-            
-            return {"parts": context_parts, "tokens": total_tokens} if context_parts else None
-            
+            # Blocking HTTP and HTML parsing; keep it off the event loop
+            search_results = await asyncio.to_thread(self.web_scraper.search_duckduckgo, context.query, max_results=3)
         except Exception as e:
             print(f"Error getting web context: {e}")
-            return None
+            return []
+
+        pages = []
+        for result in search_results or []:
+            # Prefer the page text scraped during search over the result snippet
+            scraped_content = result.get('content', '')
+            if scraped_content.startswith("[Error loading"):
+                scraped_content = ""
+            text = scraped_content or result.get('snippet', '')
+            if text:
+                pages.append({**result, "text": text})
+
+        if not pages:
+            return []
+
+        with span("web_passages"):
+            passages = await asyncio.to_thread(
+                lambda: web_passages.select(
+                    context.query_embedding,
+                    pages,
+                    context.embeddings,
+                    context.count_tokens,
+                    settings.WEB_CONTEXT_MAX_TOKENS
+                )
+            )
+
+        return [
+            Candidate(
+                source="web",
+                content=passage["content"],
+                relevance=passage["score"],
+                header=lambda candidate, result=passage["page"]: web_header(result),
+                group=passage["page"]["link"],
+                start=passage["start"],
+                embedding=passage["embedding"]
+            )
+            for passage in passages
+        ]
 
     def load_chats(self):
-        documents = []
-
-        for file in os.listdir(self.chat_dir):
-            if file.endswith(".json"):
-                file_path = os.path.join(self.chat_dir, file)
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                
-                parsed_content = json.loads(content)
-                
-                conversation_text = ""
-                messages = []
-                
-                for message in parsed_content:
-                    if message.get("role", "system") != "system":
-                        role = message.get("role", "unknown")
-                        msg_content = message.get("content", "")
-                        timestamp = message.get("timestamp", datetime.now().isoformat())
-                        
-                        messages.append(message)
-                        
-                        # Build conversation context
-                        conversation_text += f"{role}: {msg_content}\n\n"
-
-                if conversation_text.strip():
-                    doc = Document(
-                        page_content=conversation_text,
-                        metadata={
-                            "source_file": file,
-                            "message_count": len(messages),
-                            "last_updated": max([msg.get("timestamp") for msg in messages], default=datetime.now().isoformat()),
-                            "conversation_id": file.replace(".json", "")
-                        }
-                    )
+        """One document per conversation in the chat store."""
+        return [
+            doc for doc in (
+                self._conversation_document(chat_id, messages)
+                for chat_id, messages in chat_store.conversations().items()
+            )
+            if doc is not None
+        ]
 
-                    documents.append(doc)
-        
-        return documents
+    def _conversation_document(self, chat_id: str, messages: List[Dict]):
+        from langchain.schema import Document
+
+        messages = [message for message in messages if message.get("role", "system") != "system"]
+        conversation_text = "".join(f"{message['role']}: {message['content']}\n\n" for message in messages)
+        if not conversation_text.strip():
+            return None
+
+        return Document(
+            page_content=conversation_text,
+            metadata={
+                "source_file": f"{chat_id}.json",
+                "message_count": len(messages),
+                "last_updated": max(message["timestamp"] for message in messages),
+                "conversation_id": chat_id
+            }
+        )
     
     def build_index(self):
-        """Build the vector index from chat history."""
+        """Embed all chat history and publish it as a new index version. Writer process only."""
         print("Loading chat documents...")
+        indexed_seq = chat_store.last_seq()
+        versions = chat_store.chat_versions()
         documents = self.load_chats()
         
         if not documents:
@@ -220,71 +281,165 @@ class Retriever:
         print(f"Splitting {len(documents)} documents...")
         splits = self.text_splitter.split_documents(documents)
         print(f"Created {len(splits)} chunks")
-        
-        # Create vector store with open source embeddings
+
         print("Building vector index...")
-        self.vectorstore = Chroma.from_documents(
-            documents=splits,
-            embedding=self.embeddings,
-            persist_directory=self.chat_dir
-        )
+        shards = _ShardBuilder()
+        shards.add_splits(splits, self.embeddings.embed_documents([split.page_content for split in splits]))
+        self.index.publish(shards.build(), self._index_meta(indexed_seq, shards.conversations, versions))
         
-        print(f"Index built successfully with {len(splits)} chunks!")
-    
-    def load_existing_index(self, persist_directory: str = "./chat_index_opensource"):
-        """Load an existing vector index."""
-        try:
-            self.vectorstore = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=self.embeddings
+        print(f"Index built successfully with {len(splits)} chunks in {len(shards.rows)} shards!")
+
+    def load_index(self) -> Dict:
+        """Map the published index at startup and report whether it matches the current settings."""
+        snapshot = self.index.current()
+        if snapshot is None:
+            return {"version": None, "chunks": 0}
+
+        return {"version": snapshot.version, "chunks": len(snapshot), "incompatible": self._incompatible(snapshot)}
+
+    def update_index(self):
+        """
+        Bring the published index in line with the chat store. Writer process only.
+
+        A version built with a different embedding model, chunker or format is
+        rebuilt from scratch. Otherwise its manifest (each conversation's last
+        sequence number and message count) is compared with the chat store and
+        only the conversations that drifted are re-embedded; only the shards
+        they were or now are in get rewritten, plus monthly shards old enough
+        to be compacted into their year.
+        """
+        if not self.index.is_writer:
+            return
+
+        with self._index_lock:
+            snapshot = self.index.current()
+            if snapshot is None:
+                self.build_index()
+                return
+
+            reason = self._incompatible(snapshot)
+            if reason:
+                print(f"Rebuilding index: {reason}")
+                self.build_index()
+                return
+
+            indexed_seq = chat_store.last_seq()
+            manifest = snapshot.meta["manifest"]
+            stale = {
+                name for name, shard in snapshot.shards.items()
+                if shard_name(shard.start_ms, settings.INDEX_COMPACT_AFTER_MONTHS) != name
+            }
+            if indexed_seq == snapshot.meta["seq"] and not stale:
+                return
+
+            versions = chat_store.chat_versions()
+            changed = {
+                chat_id for chat_id in set(manifest) | set(versions)
+                if {k: v for k, v in manifest.get(chat_id, {}).items() if k != "shard"} != versions.get(chat_id, {})
+            }
+            if not changed and not stale:
+                return
+
+            shards = _ShardBuilder(
+                snapshot, changed, {chat_id: entry["shard"] for chat_id, entry in manifest.items() if chat_id not in changed}
             )
-            print("Existing open source index loaded successfully!")
-        except Exception as e:
-            print(f"Could not load existing index: {e}")
-            print("Building new index...")
-            self.build_index(persist_directory)
+            shards.reroute(stale | {manifest[chat_id]["shard"] for chat_id in changed if chat_id in manifest})
+
+            documents = []
+            for chat_id in changed:
+                chat = chat_store.get_chat(chat_id)
+                doc = self._conversation_document(chat_id, chat["messages"]) if chat else None
+                if doc is not None:
+                    documents.append(doc)
+
+            if documents:
+                splits = self.text_splitter.split_documents(documents)
+                shards.add_splits(splits, self.embeddings.embed_documents([split.page_content for split in splits]))
+
+            self.index.publish(shards.build(), self._index_meta(indexed_seq, shards.conversations, versions), base=snapshot)
+            print(f"Index updated: {len(changed)} conversations re-indexed, shards rewritten: {sorted(shards.rows)}")
+
+    async def run_index_updates(self, interval: float = settings.INDEX_REFRESH_SECONDS):
+        """Keep the published index in step with the chat store. Runs in the writer process."""
+        while True:
+            try:
+                await asyncio.to_thread(self.update_index)
+            except Exception as e:
+                print(f"Error updating index: {e}")
+            await asyncio.sleep(interval)
+
+    def _index_config(self) -> Dict:
+        """Everything that, if changed, makes existing vectors unusable."""
+        return {
+            "format": INDEX_FORMAT_VERSION,
+            "embedding_model": self.embedding_model,
+            "chunker": {
+                "type": "RecursiveCharacterTextSplitter",
+                "encoding": "cl100k_base",
+                "chunk_size": settings.CHUNK_SIZE,
+                "chunk_overlap": settings.CHUNK_OVERLAP,
+                "add_start_index": True
+            }
+        }
+
+    def _incompatible(self, snapshot) -> Optional[str]:
+        config = snapshot.meta.get("config")
+        if config is None:
+            return "index predates versioned snapshots"
+        for key, value in self._index_config().items():
+            if config.get(key) != value:
+                return f"{key} changed from {config.get(key)} to {value}"
+        return None
+
+    def _index_meta(self, seq: int, conversations: Dict[str, str], versions: Dict[str, Dict[str, int]]) -> Dict:
+        manifest = {
+            chat_id: {"shard": shard, **versions[chat_id]}
+            for chat_id, shard in conversations.items()
+            if chat_id in versions
+        }
+        return {"seq": seq, "config": self._index_config(), "manifest": manifest}
     
-    def search_relevant_history(self, query: str, k: int = 3) -> List[Dict]:
-        """Search for relevant chat history based on the query."""
-        if not self.vectorstore:
-            print("No index available. Building index first...")
-            self.build_index()
-        
-        if not self.vectorstore:
+    def search_relevant_history(
+        self,
+        query: str,
+        k: int = 3,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        half_life_days: Optional[float] = settings.RETRIEVAL_RECENCY_HALF_LIFE_DAYS,
+        context: Optional[RequestContext] = None
+    ) -> List[Dict]:
+        """
+        Search for relevant chat history based on the query.
+
+        Only the time shards overlapping [start_ms, end_ms] are searched. With
+        half_life_days set, results are ranked by similarity halved for every
+        half_life_days of age; similarity_score stays the raw similarity.
+        Searches only read the published snapshot; the writer's background
+        task (run_index_updates) is what keeps it up to date.
+        """
+        snapshot = self.index.current()
+        if snapshot is None or not len(snapshot):
             return []
 
-        total_docs = self.vectorstore._collection.count()
-        actual_k = min(k, total_docs)  # Don't request more than available
-    
-        # Retrieve relevant documents
-        retriever = self.vectorstore.as_retriever(search_kwargs={"k": actual_k})
-        relevant_docs = retriever.get_relevant_documents(query)
-        
-        # Remove duplicates based on content
-        seen_content = set()
-        unique_docs = []
-        for doc in relevant_docs:
-            content_hash = hash(doc.page_content)
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                unique_docs.append(doc)
+        query_embedding = context.query_embedding if context else self.embeddings.embed_query(query)
+        count_tokens = context.count_tokens if context else self.num_tokens_from_string
 
         results = []
-        for doc in relevant_docs:
-            # Calculate similarity score
-            query_embedding = self.embeddings.embed_query(query)
-            doc_embedding = self.embeddings.embed_query(doc.page_content)
-            similarity = self.cosine_similarity(query_embedding, doc_embedding)
-            
+        seen_content = set()
+        for score, similarity, record in snapshot.search(query_embedding, k, start_ms, end_ms, half_life_days):
+            # Remove duplicates based on content
+            if record["content"] in seen_content:
+                continue
+            seen_content.add(record["content"])
+
             results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
+                "content": record["content"],
+                "metadata": record["metadata"],
                 "similarity_score": similarity,
-                "token_count": self.num_tokens_from_string(doc.page_content)
+                "score": score,
+                "token_count": count_tokens(record["content"])
             })
         
-        # Sort by similarity score
-        results.sort(key=lambda x: x["similarity_score"], reverse=True)
         return results
     
     def num_tokens_from_string(self, string: str) -> int:
@@ -293,9 +448,92 @@ class Retriever:
     
     def cosine_similarity(self, vec1, vec2):
         """Calculate cosine similarity between two vectors."""
+        import numpy as np
+
         dot_product = np.dot(vec1, vec2)
         norm_vec1 = np.linalg.norm(vec1)
         norm_vec2 = np.linalg.norm(vec2)
         return dot_product / (norm_vec1 * norm_vec2)
 
+def chat_header(candidate: Candidate, metadata: Dict) -> str:
+    header = f"[CHAT HISTORY | Similarity: {candidate.relevance:.3f}"
+    if "conversation_id" in metadata:
+        header += f" | Chat: {metadata['conversation_id']}"
+    if "last_updated" in metadata:
+        try:
+            last_updated = metadata['last_updated']
+            if isinstance(last_updated, (int, float)):
+                dt = datetime.fromtimestamp(last_updated / 1000)
+            else:
+                dt = datetime.fromisoformat(last_updated.replace('Z', '+00:00'))
+            header += f" | Date: {dt.strftime('%Y-%m-%d')}"
+        except:
+            pass
+    return header + "]\n"
+
+
+def web_header(result: Dict) -> str:
+    return f"[WEB SEARCH | Source: {result.get('source', 'web')} | URL: {result['link']}]\nTitle: {result['title']}\nContent: "
+
+
+class _ShardBuilder:
+    """Collects the rows of the shards a publish rewrites, routing each row to its time shard."""
+    def __init__(self, base=None, exclude: Optional[set] = None, conversations: Optional[Dict[str, str]] = None):
+        self.base = base
+        self.exclude = exclude or set()
+        self.conversations: Dict[str, str] = conversations if conversations is not None else {}
+        self.rows: Dict[str, Dict[str, list]] = {}
+
+    def reroute(self, names: set):
+        """Empty existing shards and send their rows, minus excluded conversations, to where they belong now."""
+        names = {name for name in names if self.base is not None and name in self.base.shards}
+        existing = [self._existing(name) for name in names]
+        for name in names:
+            self.rows[name] = {"vectors": [], "records": []}
+        for vectors, records in existing:
+            self._route(vectors, records)
+
+    def add_splits(self, splits, vectors: List[List[float]]):
+        import numpy as np
+
+        self._route(
+            np.array(vectors, dtype=np.float32),
+            [{"content": split.page_content, "metadata": split.metadata} for split in splits]
+        )
+
+    def build(self) -> Dict[str, tuple]:
+        import numpy as np
+
+        return {
+            name: (np.concatenate(rows["vectors"]) if rows["vectors"] else np.zeros((0, 0), np.float32), rows["records"])
+            for name, rows in self.rows.items()
+        }
+
+    def _route(self, vectors: "np.ndarray", records: List[Dict]):
+        import numpy as np
+
+        groups: Dict[str, List[int]] = {}
+        for i, record in enumerate(records):
+            name = shard_name(record["metadata"]["last_updated"], settings.INDEX_COMPACT_AFTER_MONTHS)
+            groups.setdefault(name, []).append(i)
+            self.conversations[record["metadata"]["conversation_id"]] = name
+
+        for name, indices in groups.items():
+            if name not in self.rows:
+                # Adding to a shard this publish hasn't touched yet: start from its current rows
+                existing_vectors, existing_records = self._existing(name)
+                self.rows[name] = {"vectors": [existing_vectors] if existing_records else [], "records": existing_records}
+            self.rows[name]["vectors"].append(np.asarray(vectors[indices], dtype=np.float32))
+            self.rows[name]["records"].extend(records[i] for i in indices)
+
+    def _existing(self, name: str):
+        import numpy as np
+
+        if self.base is None or name not in self.base.shards:
+            return np.zeros((0, 0), np.float32), []
+        shard = self.base.shards[name]
+        keep = [i for i, record in enumerate(shard.records) if record["metadata"]["conversation_id"] not in self.exclude]
+        return np.asarray(shard.vectors[keep], dtype=np.float32), [shard.records[i] for i in keep]
+
+
 retriever = Retriever()
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, Dict
+
+from config.settings import settings
+from core.metrics import queue_seconds, shed_total
+from core.request_policy import DeadlineExceeded, LatencyTracker, remaining_time
+
+_client_id: contextvars.ContextVar[str] = contextvars.ContextVar("client_id", default="anonymous")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class QueueFull(Exception):
+    """Raised when a call is shed instead of queued."""
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@contextmanager
+def client_scope(client_id: str):
+    """Attribute scheduled calls made inside the block to client_id."""
+    token = _client_id.set(client_id or "anonymous")
+    try:
+        yield
+    finally:
+        _client_id.reset(token)
+
+
+class Scheduler:
+    """
+    Admission control for model calls.
+
+    At most max_concurrency calls run at once. Waiting calls are served by
+    priority, and round-robin between clients within a priority so one busy
+    client can't starve the rest. When a client or priority queue is full the
+    call is shed with QueueFull rather than left to wait indefinitely.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = settings.SCHEDULER_MAX_CONCURRENCY,
+        max_queue: int = settings.SCHEDULER_MAX_QUEUE,
+        max_per_client: int = settings.SCHEDULER_MAX_PER_CLIENT
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self._active = 0
+        self._queues: Dict[Priority, "OrderedDict[str, deque]"] = {priority: OrderedDict() for priority in Priority}
+        self.queue_times = LatencyTracker()
+        self.stats = {priority.name.lower(): {"admitted": 0, "shed": 0} for priority in Priority}
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE):
+        """Wait for a free slot, hold it for the duration of the block."""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def saturated(self) -> bool:
+        """Every slot is taken or calls are already waiting."""
+        return self._active >= self.max_concurrency or any(self._queued(p) for p in Priority)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": {priority.name.lower(): self._queued(priority) for priority in Priority},
+            "queue_seconds": self.queue_times.summary(),
+            "stats": self.stats
+        }
+
+    async def _acquire(self, priority: Priority):
+        client_id = _client_id.get()
+        stats = self.stats[priority.name.lower()]
+        start = time.perf_counter()
+
+        if self._active < self.max_concurrency and not any(self._queued(p) for p in Priority):
+            self._active += 1
+            stats["admitted"] += 1
+            self.queue_times.record(priority.name.lower(), 0.0)
+            queue_seconds.observe(0.0, priority.name.lower())
+            return
+
+        queue = self._queues[priority]
+        waiting = queue.get(client_id)
+        if waiting is not None and len(waiting) >= self.max_per_client:
+            stats["shed"] += 1
+            shed_total.inc(priority.name.lower())
+            raise QueueFull(f"Too many queued requests from {client_id}", status_code=429)
+        if self._queued(priority) >= self.max_queue:
+            stats["shed"] += 1
+            shed_total.inc(priority.name.lower())
+            raise QueueFull("Server is at capacity, try again shortly", status_code=503)
+
+        future = asyncio.get_running_loop().create_future()
+        queue.setdefault(client_id, deque()).append(future)
+
+        try:
+            timeout = remaining_time()
+            if timeout is not None and timeout <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted a slot just as we gave up on it, hand it on
+                self._release()
+            else:
+                future.cancel()
+                self._discard(priority, client_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                raise DeadlineExceeded("Deadline passed while queued")
+            raise
+
+        waited = time.perf_counter() - start
+        stats["admitted"] += 1
+        self.queue_times.record(priority.name.lower(), waited)
+        queue_seconds.observe(waited, priority.name.lower())
+
+    def _release(self):
+        self._active -= 1
+
+        while self._active < self.max_concurrency:
+            future = self._next_waiter()
+            if future is None:
+                return
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+    def _next_waiter(self):
+        for priority in Priority:
+            queue = self._queues[priority]
+            if not queue:
+                continue
+
+            client_id, waiting = next(iter(queue.items()))
+            future = waiting.popleft()
+            # Rotate so the next pick in this priority goes to another client
+            del queue[client_id]
+            if waiting:
+                queue[client_id] = waiting
+            return future
+        return None
+
+    def _discard(self, priority: Priority, client_id: str, future):
+        waiting = self._queues[priority].get(client_id)
+        if waiting is None:
+            return
+        try:
+            waiting.remove(future)
+        except ValueError:
+            pass
+        if not waiting:
+            del self._queues[priority][client_id]
+
+    def _queued(self, priority: Priority) -> int:
+        return sum(len(waiting) for waiting in self._queues[priority].values())
+
+
+scheduler = Scheduler()
@@ -0,0 +1,66 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict
+
+from config.settings import settings
+
+
+class SharedState:
+    """
+    Small JSON key-value store shared by every worker process.
+
+    Mutable state that used to live in module-level dicts (connection status,
+    job tables) goes here so all workers agree on it. Backed by SQLite in WAL
+    mode; update() runs read-modify-write in one immediate transaction, so
+    concurrent updates from different processes don't lose writes.
+    """
+    def __init__(self, path: str = settings.SHARED_STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._connection().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def update(self, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        """Atomically replace the value for key with fn(current value). Returns the new value."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+            value = fn(default if row is None else json.loads(row[0]))
+            conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def items(self, prefix: str = "") -> Dict[str, Any]:
+        rows = self._connection().execute(
+            "SELECT key, value FROM state WHERE key >= ? AND key < ?", (prefix, prefix + "￿")
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Autocommit; update() manages its own transaction
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+
+shared_state = SharedState()
@@ -1,29 +1,48 @@
 from typing import Any, Dict
 
+from core.shared_state import shared_state
 from schema import InferenceMode
-from tensorlink import UserNode
-from tensorlink.ml.module import DistributedModel
+
+DEFAULT_STATUS = {"connected": False, "inference_mode": InferenceMode.API.value}
 
 
 class TensorlinkManager():
+    """
+    Connection status and inference mode are kept in the shared state store so
+    every worker process agrees on them; the node handle and distributed
+    models are live objects and stay local to the process that created them.
+    """
     def __init__(self):
-        self.status = {
-            "connected": True,
-            "node": None,
-            "distributed_models": {},
-            "inference_mode": InferenceMode.API
+        self.node = None
+        self.distributed_models: Dict[str, Any] = {}
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        return {
+            **shared_state.get("tensorlink", DEFAULT_STATUS),
+            "node": self.node,
+            "distributed_models": self.distributed_models
         }
+
+    def reset(self):
+        """Forget status left over from a previous run."""
+        shared_state.set("tensorlink", DEFAULT_STATUS)
+
+    def _update_status(self, **changes):
+        shared_state.update("tensorlink", lambda status: {**status, **changes}, default=DEFAULT_STATUS)
     
     async def connect(self) -> Dict[str, Any]:
         """Connect to Tensorlink"""
         try:
             if not self.status.get("connected"):
                 print("Launching Tensorlink Node...")
+                # Imported here so the tensorlink package isn't loaded at startup
+                # from tensorlink import UserNode
                 # node = UserNode()
                 node = True
                 if node:
-                    self.status["connected"] = True
-                    self.status["node"] = node
+                    self.node = node
+                    self._update_status(connected=True)
                     return {"success": True, "message": "Connected to Tensorlink."}
         except Exception as e:
             return {"success": False, "message": f"Error connecting to Tensorlink: {e}"}
@@ -34,20 +53,21 @@ class TensorlinkManager():
         """Disconnect from Tensorlink and cleanup resources."""
         try:
             if self.status.get("connected"):
-                node = self.status.get("node")
-                if node:
+                node = self.node
+                if node and hasattr(node, 'cleanup'):
                     node.cleanup()
+                self.node = None
                 
                 # Cleanup distributed models
-                for model in self.status["distributed_models"].values():
+                for model in self.distributed_models.values():
                     if hasattr(model, 'cleanup'):
                         try:
                             model.cleanup()
                         except Exception as e:
                             print(f"Error cleaning up model: {e}")
                 
-                self.status["distributed_models"].clear()
-                self.status["connected"] = False
+                self.distributed_models.clear()
+                self._update_status(connected=False)
                 
             return {"success": True, "message": "Disconnected from Tensorlink"}
         except Exception as e:
@@ -57,9 +77,9 @@ class TensorlinkManager():
     #     device = device or settings.DEFAULT_DEVICE
 
     def get_mode(self) -> InferenceMode:
-        return self.status.get("inference_mode")
+        return InferenceMode(self.status.get("inference_mode"))
     
     def set_mode(self, mode: InferenceMode):
-        self.status["inference_mode"] = mode
+        self._update_status(inference_mode=InferenceMode(mode).value)
 
 tensorlink_manager = TensorlinkManager()
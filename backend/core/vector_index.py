@@ -0,0 +1,405 @@
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Bump when the on-disk layout changes; older versions are rebuilt
+INDEX_FORMAT_VERSION = 2
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# (combined score, cosine similarity, record)
+SearchHit = Tuple[float, float, Dict[str, Any]]
+
+
+class IndexShard:
+    """
+    The chunks of one time period, mapped read-only on first use.
+
+    vectors.npy holds L2-normalized float32 embeddings, timestamps.npy each
+    chunk's conversation time in ms, and records.jsonl the chunk text and
+    metadata. Shards outside a search's date range are never opened, so old
+    shards cost nothing until someone asks about that period.
+    """
+    def __init__(self, path: str, info: Dict[str, Any]):
+        self.path = path
+        self.name = info["name"]
+        self.start_ms = info["start_ms"]
+        self.end_ms = info["end_ms"]
+        self.chunks = info["chunks"]
+        self._records: Optional[ShardRecords] = None
+        self._vectors = None
+        self._timestamps = None
+        self._lock = threading.Lock()
+
+    @property
+    def records(self) -> "ShardRecords":
+        self._open()
+        return self._records
+
+    @property
+    def vectors(self) -> "np.ndarray":
+        self._open()
+        return self._vectors
+
+    @property
+    def timestamps(self) -> "np.ndarray":
+        self._open()
+        return self._timestamps
+
+    def overlaps(self, start_ms: Optional[int], end_ms: Optional[int]) -> bool:
+        return (start_ms is None or self.end_ms >= start_ms) and (end_ms is None or self.start_ms <= end_ms)
+
+    def search(
+        self,
+        query: "np.ndarray",
+        k: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        half_life_days: Optional[float] = None,
+        now_ms: Optional[int] = None
+    ) -> List[SearchHit]:
+        """This shard's top k, by similarity decayed by age when half_life_days is set."""
+        import numpy as np
+
+        if not self.chunks or k <= 0:
+            return []
+
+        similarities = self.vectors @ query
+        scores = similarities
+        if half_life_days:
+            age_days = np.maximum(now_ms - self.timestamps, 0) / DAY_MS
+            scores = similarities * np.power(0.5, age_days / half_life_days)
+
+        # Only shards straddling an edge of the range need a per-chunk filter
+        if (start_ms is not None and self.start_ms < start_ms) or (end_ms is not None and self.end_ms > end_ms):
+            in_range = np.ones(len(scores), dtype=bool)
+            if start_ms is not None:
+                in_range &= self.timestamps >= start_ms
+            if end_ms is not None:
+                in_range &= self.timestamps <= end_ms
+            scores = np.where(in_range, scores, -np.inf)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), float(similarities[i]), self.records[i]) for i in top if np.isfinite(scores[i])]
+
+    def _open(self):
+        if self._records is not None:
+            return
+        with self._lock:
+            if self._records is None:
+                import numpy as np
+
+                self._vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+                self._timestamps = np.load(os.path.join(self.path, "timestamps.npy"), mmap_mode="r")
+                self._records = ShardRecords(self.path)
+
+
+class ShardRecords:
+    """
+    A shard's records, mapped read-only like its vectors.
+
+    records.jsonl holds one JSON record per line and offsets.npy where each
+    line starts, so workers share the file through the page cache and only
+    parse the records a search actually returns.
+    """
+    def __init__(self, path: str):
+        import numpy as np
+
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "records.jsonl"), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return json.loads(self._data[int(self._offsets[i]):int(self._offsets[i + 1])])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class IndexSnapshot:
+    """
+    One immutable version of the index: a set of time shards.
+
+    Shards are searched in parallel, each returning its own top k, and the
+    results are merged into a global top k. Every worker process searching the
+    same version shares the mapped shard files through the OS page cache.
+    """
+    def __init__(self, path: str, executor: ThreadPoolExecutor):
+        self.path = path
+        self.version = os.path.basename(path)
+        self._executor = executor
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.shards: Dict[str, IndexShard] = {
+            info["name"]: IndexShard(os.path.join(path, "shards", info["name"]), info)
+            for info in self.meta["shards"]
+        }
+
+    def __len__(self) -> int:
+        return sum(shard.chunks for shard in self.shards.values())
+
+    def search(
+        self,
+        query_vector: List[float],
+        k: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        half_life_days: Optional[float] = None
+    ) -> List[SearchHit]:
+        """The k best chunks across the shards overlapping [start_ms, end_ms]."""
+        shards = [shard for shard in self.shards.values() if shard.chunks and shard.overlaps(start_ms, end_ms)]
+        if not shards or k <= 0:
+            return []
+
+        import numpy as np
+
+        query = normalize(np.asarray(query_vector, dtype=np.float32))
+        now_ms = int(time.time() * 1000)
+        args = (query, k, start_ms, end_ms, half_life_days, now_ms)
+
+        if len(shards) == 1:
+            per_shard = [shards[0].search(*args)]
+        else:
+            per_shard = list(self._executor.map(lambda shard: shard.search(*args), shards))
+
+        hits = [hit for shard_hits in per_shard for hit in shard_hits]
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return hits[:k]
+
+    def shard_searches(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> int:
+        """How many shards a search over this range would touch."""
+        return sum(1 for shard in self.shards.values() if shard.chunks and shard.overlaps(start_ms, end_ms))
+
+
+class SharedIndex:
+    """
+    Versioned index snapshots under a directory, safe to share across processes.
+
+    Exactly one process holds the writer lock and publishes new versions; it
+    writes each version into its own directory and then atomically repoints
+    CURRENT at it. Every process (the writer included) maps whatever CURRENT
+    names, and remaps when it changes, so readers never see a half-written
+    index and never block on the writer. Shards a new version doesn't change
+    are hard-linked from the previous one rather than rewritten.
+
+    Shards are opened lazily, so a reader may still open files of a version
+    after a newer one is published. Old versions are only deleted once they
+    have been superseded for grace_seconds, besides the newest keep_versions.
+    """
+    def __init__(self, root: str, keep_versions: int = 2, search_threads: int = 4, grace_seconds: float = 300.0):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.grace_seconds = grace_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(search_threads, 1), thread_name_prefix="index-search")
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._current_identity: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._writer_fd: Optional[int] = None
+
+        os.makedirs(os.path.join(self.root, "versions"), exist_ok=True)
+
+    @property
+    def is_writer(self) -> bool:
+        return self._writer_fd is not None
+
+    def try_acquire_writer(self) -> bool:
+        """
+        Become the single writer process if no other process is. Held until exit.
+
+        A writer that died mid-publish leaves its staging directory behind;
+        the next one to take the lock removes it.
+        """
+        if self._writer_fd is not None:
+            return True
+
+        fd = os.open(os.path.join(self.root, "writer.lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+
+        self._writer_fd = fd
+        self._remove_staging()
+        return True
+
+    def release_writer(self):
+        """Give up the writer lock so another process can take it."""
+        if self._writer_fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._writer_fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self._writer_fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._writer_fd)
+        self._writer_fd = None
+
+    def current(self) -> Optional[IndexSnapshot]:
+        """The published snapshot, remapped if a newer version has been published."""
+        pointer = os.path.join(self.root, "CURRENT")
+        try:
+            stat = os.stat(pointer)
+        except FileNotFoundError:
+            return None
+
+        # CURRENT is replaced, never rewritten in place, so a new inode means a new version
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity == self._current_identity and self._snapshot is not None:
+            return self._snapshot
+
+        with self._lock:
+            if identity != self._current_identity or self._snapshot is None:
+                with open(pointer, "r", encoding="utf-8") as f:
+                    version = f.read().strip()
+                self._snapshot = IndexSnapshot(os.path.join(self.root, "versions", version), self._executor)
+                self._current_identity = identity
+
+        return self._snapshot
+
+    def publish(
+        self,
+        shards: Dict[str, Tuple["np.ndarray", List[Dict[str, Any]]]],
+        meta: Dict[str, Any],
+        base: Optional[IndexSnapshot] = None
+    ) -> str:
+        """
+        Write a new version and make it current. Only the writer may publish.
+
+        Args:
+            shards: Shard name -> (vectors, records) for every shard that
+                changed; an empty shard is dropped
+            base: Version to carry all other shards over from
+        """
+        if not self.is_writer:
+            raise RuntimeError("Only the index writer process can publish")
+
+        version = f"{time.time_ns()}"
+        final = os.path.join(self.root, "versions", version)
+        staging = final + ".tmp"
+        os.makedirs(os.path.join(staging, "shards"))
+
+        infos = []
+        if base is not None:
+            for name, shard in base.shards.items():
+                if name not in shards:
+                    link_tree(shard.path, os.path.join(staging, "shards", name))
+                    infos.append({"name": name, "start_ms": shard.start_ms, "end_ms": shard.end_ms, "chunks": shard.chunks})
+
+        for name, (vectors, records) in shards.items():
+            if records:
+                infos.append(write_shard(os.path.join(staging, "shards", name), name, vectors, records))
+
+        infos.sort(key=lambda info: info["start_ms"])
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({**meta, "version": version, "chunks": sum(i["chunks"] for i in infos), "shards": infos, "created_at": time.time()}, f)
+
+        # Flush everything before CURRENT can point at it, so a crash leaves the old version current
+        for directory, _, files in os.walk(staging):
+            for file in files:
+                fsync_path(os.path.join(directory, file))
+        os.replace(staging, final)
+
+        pointer = os.path.join(self.root, "CURRENT")
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer + ".tmp", pointer)
+
+        self._remove_old_versions()
+        return version
+
+    def _remove_staging(self):
+        versions_dir = os.path.join(self.root, "versions")
+        for version in os.listdir(versions_dir):
+            if version.endswith(".tmp"):
+                shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+    def _remove_old_versions(self):
+        versions_dir = os.path.join(self.root, "versions")
+        versions = sorted((v for v in os.listdir(versions_dir) if v.isdigit()), key=int)
+        now_ns = time.time_ns()
+        # Version names are publish times, so a version was superseded when the next one was named
+        for version, successor in zip(versions[:-self.keep_versions], versions[1:]):
+            if now_ns - int(successor) < self.grace_seconds * 1e9:
+                break
+            # Readers that still map an old version keep their pages until they remap
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+
+def write_shard(path: str, name: str, vectors: "np.ndarray", records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import numpy as np
+
+    os.makedirs(path)
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(records), -1)
+    timestamps = np.array([record["metadata"]["last_updated"] for record in records], dtype=np.int64)
+
+    np.save(os.path.join(path, "vectors.npy"), normalize(vectors))
+    np.save(os.path.join(path, "timestamps.npy"), timestamps)
+
+    lines = [json.dumps(record).encode("utf-8") + b"\n" for record in records]
+    np.save(os.path.join(path, "offsets.npy"), np.cumsum([0] + [len(line) for line in lines], dtype=np.int64))
+    with open(os.path.join(path, "records.jsonl"), "wb") as f:
+        f.writelines(lines)
+
+    return {"name": name, "start_ms": int(timestamps.min()), "end_ms": int(timestamps.max()), "chunks": len(records)}
+
+
+def fsync_path(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def link_tree(source: str, destination: str):
+    """Hard-link an unchanged shard into a new version, copying where links aren't supported."""
+    os.makedirs(destination)
+    for file in os.listdir(source):
+        try:
+            os.link(os.path.join(source, file), os.path.join(destination, file))
+        except OSError:
+            shutil.copy2(os.path.join(source, file), os.path.join(destination, file))
+
+
+def shard_name(timestamp_ms: int, compact_after_months: int, now: Optional[datetime] = None) -> str:
+    """
+    Monthly shard ("2024-05") for recent history; yearly ("2023") once a
+    month is more than compact_after_months old, so old history collapses
+    into a few large shards.
+    """
+    now = now or datetime.now(timezone.utc)
+    moment = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+    months_old = (now.year - moment.year) * 12 + now.month - moment.month
+    if compact_after_months and months_old > compact_after_months:
+        return f"{moment.year:04d}"
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+def normalize(vectors: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class Warmup:
+    """
+    Background initialization of heavy subsystems after the server is up.
+
+    Each component moves through pending -> loading -> ready (or error), and
+    /api/status reports them so the UI can tell when the first chat won't
+    have to wait on model loading.
+    """
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self._task = None
+
+    def register(self, name: str, fn: Callable[[], Any]):
+        self._steps.append((name, fn))
+        self.components[name] = {"state": "pending"}
+
+    def start(self):
+        """Run the registered steps in a worker thread. Must be called from the event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def ready(self) -> bool:
+        return all(component["state"] == "ready" for component in self.components.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "components": self.components}
+
+    async def _run(self):
+        for name, fn in self._steps:
+            component = self.components[name]
+            component["state"] = "loading"
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(fn)
+                component["state"] = "ready"
+            except Exception as e:
+                print(f"Warmup of {name} failed: {e}")
+                component["state"] = "error"
+                component["error"] = str(e)
+            component["seconds"] = round(time.perf_counter() - start, 3)
+
+
+warmup = Warmup()
@@ -0,0 +1,146 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class WebPassages:
+    """
+    Picks the parts of scraped pages that answer the query.
+
+    Page text is split into passages of about passage_tokens tokens, every
+    passage not already cached is embedded in one batched call across all
+    pages, and passages are ranked by similarity to the query. Each page's
+    passages and vectors are cached by URL and content hash, so a page that
+    comes up again isn't re-embedded.
+    """
+    def __init__(
+        self,
+        passage_tokens: int = settings.WEB_PASSAGE_TOKENS,
+        max_pages: int = settings.WEB_PASSAGE_CACHE_PAGES
+    ):
+        self.passage_tokens = passage_tokens
+        self.max_pages = max_pages
+        self._cache: "OrderedDict[str, Tuple[List[Tuple[int, str]], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "passages_embedded": 0}
+
+    def select(
+        self,
+        query_vector: List[float],
+        pages: List[Dict[str, Any]],
+        embeddings,
+        count_tokens: Callable[[str], int],
+        max_tokens: int
+    ) -> List[Dict[str, Any]]:
+        """
+        The best passages across pages, most similar first, totalling at most max_tokens.
+
+        Args:
+            pages: Dicts with "link" and "text"
+
+        Returns:
+            List of {"page", "content", "start", "score", "embedding"}
+        """
+        import numpy as np
+
+        keys = [self._key(page["link"], page["text"]) for page in pages]
+        entries: Dict[str, Tuple[List[Tuple[int, str]], np.ndarray]] = {}
+        to_embed: List[Tuple[str, List[Tuple[int, str]]]] = []
+
+        with self._lock:
+            for key, page in zip(keys, pages):
+                if key in entries or any(key == pending for pending, _ in to_embed):
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    entries[key] = self._cache[key]
+                    self.stats["hits"] += 1
+                else:
+                    to_embed.append((key, self.split(page["text"], count_tokens)))
+                    self.stats["misses"] += 1
+
+        texts = [text for _, passages in to_embed for _, text in passages]
+        if texts:
+            # One encode call for every new passage on every page
+            vectors = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+            self.stats["passages_embedded"] += len(texts)
+            offset = 0
+            with self._lock:
+                for key, passages in to_embed:
+                    entries[key] = (passages, vectors[offset:offset + len(passages)])
+                    offset += len(passages)
+                    self._cache[key] = entries[key]
+                while len(self._cache) > self.max_pages:
+                    self._cache.popitem(last=False)
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        scored = []
+        for key, page in zip(keys, pages):
+            passages, vectors = entries.get(key, ([], None))
+            if not passages:
+                continue
+            norms = np.linalg.norm(vectors, axis=1)
+            scores = vectors @ query / np.where(norms == 0, 1, norms)
+            scored.extend(
+                {"page": page, "content": text, "start": start, "score": float(score), "embedding": vector}
+                for (start, text), score, vector in zip(passages, scores, vectors)
+            )
+
+        scored.sort(key=lambda passage: passage["score"], reverse=True)
+
+        selected, used = [], 0
+        for passage in scored:
+            tokens = count_tokens(passage["content"])
+            if used + tokens <= max_tokens:
+                selected.append(passage)
+                used += tokens
+        return selected
+
+    def split(self, text: str, count_tokens: Callable[[str], int]) -> List[Tuple[int, str]]:
+        """Split text into (character offset, passage) of about passage_tokens tokens, on paragraph then sentence boundaries."""
+        pieces: List[Tuple[int, str]] = []
+        for match in re.finditer(r"[^\n]+", text):
+            paragraph = match.group().strip()
+            if not paragraph:
+                continue
+            if count_tokens(paragraph) <= self.passage_tokens:
+                pieces.append((match.start(), paragraph))
+                continue
+            position = match.start()
+            for sentence in SENTENCE_END.split(match.group()):
+                position = text.find(sentence, position)
+                if sentence.strip():
+                    pieces.append((position, sentence.strip()))
+                position += len(sentence)
+
+        starts: List[int] = []
+        current_tokens = 0
+        for start, piece in pieces:
+            tokens = count_tokens(piece)
+            if not starts or current_tokens + tokens > self.passage_tokens:
+                starts.append(start)
+                current_tokens = 0
+            current_tokens += tokens
+
+        # Each passage runs up to where the next begins, so neighbours can be merged back
+        # together by offset; newlines become spaces to keep offsets aligned with the page text
+        ends = starts[1:] + [pieces[-1][0] + len(pieces[-1][1])] if pieces else []
+        return [(start, text[start:end].replace("\n", " ")) for start, end in zip(starts, ends)]
+
+    @staticmethod
+    def _key(url: str, text: str) -> str:
+        return f"{url}#{hashlib.sha1(text.encode()).hexdigest()}"
+
+
+web_passages = WebPassages()
@@ -1,10 +1,13 @@
 import random
 import time
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List
 
 import requests
-from bs4 import BeautifulSoup
-from requests_html import HTMLSession
+from config.settings import settings
+from core.metrics import span
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 
 class WebScraper:
@@ -16,13 +19,24 @@ class WebScraper:
                           '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
 
-        # Set up requests-html session for JS rendering
-        self.html_session = HTMLSession()
+        # requests-html (and the browser it drives) is only set up when a page is first scraped
+        self._html_session = None
+
+    @property
+    def html_session(self):
+        """requests-html session for JS rendering, created on first use."""
+        if self._html_session is None:
+            from requests_html import HTMLSession
+            self._html_session = HTMLSession()
+        return self._html_session
 
     def search_duckduckgo(self, query: str, max_results: int = 10) -> List[Dict]:
         """Search DuckDuckGo and return results with snippets."""
+        from bs4 import BeautifulSoup
+
         try:
-            html = self.session.get(f"https://html.duckduckgo.com/html/?q={query}").text
+            with span("web_search"):
+                html = self.session.get(settings.WEB_SEARCH_URL, params={"q": query}).text
             soup = BeautifulSoup(html, 'html.parser')
 
             results = []
@@ -39,7 +53,8 @@ class WebScraper:
             selected_pages = random.sample(results, min(4, len(results)))
 
             for page in selected_pages:
-                page['content'] = self.get_text_with_requests_html(page['link'])
+                with span("web_scrape"):
+                    page['content'] = self.get_text_with_requests_html(page['link'])
 
             return selected_pages
 
@@ -49,6 +64,8 @@ class WebScraper:
 
     def get_text_with_requests_html(self, url: str) -> str:
         """Extract text content from URL using requests-html with JS rendering."""
+        from bs4 import BeautifulSoup
+
         try:
             # First try basic requests (faster)
             basic_response = self.html_session.get(url, timeout=10)
@@ -57,34 +74,35 @@ class WebScraper:
             # Quick check if we got substantial content without JS
             basic_text = self._extract_text_from_soup(basic_soup)
             if len(basic_text) > 200:  # Good enough content found
-                return basic_text[:1000]
+                return basic_text[:settings.WEB_PAGE_MAX_CHARS]
             
             # Fall back to JS rendering for dynamic content
             print(f"[JS Rendering] {url}")
             basic_response.html.render(timeout=15, wait=2)
             
             # Extract text from rendered content
-            return self._extract_text_from_rendered_html(basic_response.html)[:1000]
+            return self._extract_text_from_rendered_html(basic_response.html)[:settings.WEB_PAGE_MAX_CHARS]
 
         except Exception as e:
             return f"[Error loading {url}]: {e}"
 
-    def _extract_text_from_soup(self, soup: BeautifulSoup) -> str:
+    def _extract_text_from_soup(self, soup: "BeautifulSoup") -> str:
         """Extract text from BeautifulSoup object."""
         # Try to get main content by <article> first
+        # Newline separators keep paragraphs apart for passage splitting
         article = soup.find("article")
         if article:
-            return article.get_text(strip=True)
+            return article.get_text("\n", strip=True)
 
         # Try main content areas
         main_content = soup.find("main") or soup.find("div", class_=lambda x: x and "content" in x.lower())
         if main_content:
-            return main_content.get_text(strip=True)
+            return main_content.get_text("\n", strip=True)
 
         # Fall back to paragraphs
         paragraphs = soup.find_all("p")
-        visible_texts = [p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)]
-        return "\n".join(visible_texts[:5])
+        visible_texts = [p.get_text(" ", strip=True) for p in paragraphs if p.get_text(strip=True)]
+        return "\n".join(visible_texts)
 
     def _extract_text_from_rendered_html(self, html_obj) -> str:
         """Extract text from requests-html rendered object."""
@@ -106,7 +124,7 @@ class WebScraper:
 
             # Fall back to paragraphs
             paragraphs = html_obj.find('p')
-            visible_texts = [p.text.strip() for p in paragraphs[:5] if p.text.strip()]
+            visible_texts = [p.text.strip() for p in paragraphs if p.text.strip()]
             return "\n".join(visible_texts)
 
         except Exception as e:
@@ -115,6 +133,7 @@ class WebScraper:
     def close(self):
         """Clean up resources."""
         try:
-            self.html_session.close()
+            if self._html_session is not None:
+                self._html_session.close()
         except:
             pass
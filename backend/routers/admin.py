@@ -0,0 +1,65 @@
+import asyncio
+import hmac
+from typing import Optional
+
+from config.settings import settings
+from core.profiler import profiler
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter(tags=["admin"])
+
+# Coarser sampling than this wouldn't show anything useful
+MAX_INTERVAL_MS = 1000.0
+
+
+def require_admin(token: Optional[str]):
+    """Profiling is off unless enabled in settings, and refused unless an admin token is set and given."""
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling needs ADMIN_TOKEN to be configured")
+    if not hmac.compare_digest((token or "").encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+async def run_session(seconds: Optional[float], interval_ms: float, chat_requests: int, include_idle: bool, top: int, output: str):
+    try:
+        session = profiler.start(seconds, interval_ms / 1000, chat_requests, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    await asyncio.to_thread(session.finished.wait)
+
+    if output == "collapsed":
+        return PlainTextResponse(session.collapsed())
+    return session.result(top)
+
+
+@router.post("/admin/profile")
+async def profile_for(
+    seconds: float = 10.0,
+    interval_ms: float = Query(5.0, gt=0, le=MAX_INTERVAL_MS),
+    top: int = 20,
+    include_idle: bool = False,
+    output: str = "json",
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Sample every thread for the given number of seconds."""
+    require_admin(x_admin_token)
+    seconds = min(max(seconds, 0.1), settings.PROFILING_MAX_SECONDS)
+    return await run_session(seconds, interval_ms, 0, include_idle, top, output)
+
+
+@router.post("/admin/profile/chat")
+async def profile_chat_requests(
+    count: int = 5,
+    interval_ms: float = Query(5.0, gt=0, le=MAX_INTERVAL_MS),
+    top: int = 20,
+    include_idle: bool = False,
+    output: str = "json",
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Sample while the next count /api/chat requests are in flight (up to PROFILING_MAX_SECONDS)."""
+    require_admin(x_admin_token)
+    return await run_session(settings.PROFILING_MAX_SECONDS, interval_ms, max(count, 1), include_idle, top, output)
@@ -1,8 +1,23 @@
+import asyncio
+import json
+from typing import List, Optional, Tuple
+
 import requests
+from config.settings import settings
+from core.batch import batch_runner
+from core.chat_store import chat_store
+from core.conversation_memory import conversation_memory
 from core.inference_engine import inference_engine
+from core.metrics import span, trace_scope
+from core.prefetch import prefetcher
+from core.profiler import profiler
+from core.request_policy import DeadlineExceeded, deadline_scope
+from core.scheduler import QueueFull, client_scope, scheduler
 from core.tensorlink_manager import tensorlink_manager
-from fastapi import APIRouter, HTTPException
-from schema import ChatRequest, ChatResponse, InferenceMode
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from schema import BatchChatRequest, BatchItem, ChatRequest, ChatResponse, ChatSettings, InferenceMode, PrefetchRequest
 
 https_serv = "https://smartnodes.ddns.net/tensorlink-api"
 http_serv = "http://smartnodes.ddns.net/tensorlink-api"
@@ -10,30 +25,168 @@ http_serv = "http://smartnodes.ddns.net/tensorlink-api"
 router = APIRouter(tags=["chat"])
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Send message to the selected model."""    
+    profiler.request_started()
     try:
-        message = request.message
-        model_name = request.settings.modelName
-        temperature = request.settings.temperature
+        client_id = http_request.client.host if http_request.client else "anonymous"
+        with trace_scope("chat") as trace, deadline_scope(settings.CHAT_DEADLINE_SECONDS), client_scope(client_id):
+            message = request.message
+            model_name = request.settings.modelName
+            temperature = request.settings.temperature
+            conversation_id = request.conversationId
+
+            history = []
+            if conversation_id:
+                with span("history"):
+                    history = await conversation_memory.build_history(conversation_id, message)
         
-        current_mode = tensorlink_manager.get_mode()
-
-        if current_mode == InferenceMode.API:
-            response_data = await inference_engine.api_inference(
-                model_name=model_name,
-                message=message,
-                temperature=request.temperature,
-                # max_new_tokens=request.settings.max_new_tokens
-            )
+            current_mode = tensorlink_manager.get_mode()
+
+            if current_mode == InferenceMode.API:
+                # Reuse the retrieval prepared while this message was being typed
+                with span("prefetch"):
+                    prefetched = await prefetcher.take(message, prefetch_client_key(client_id, conversation_id))
+                context, prepared = prefetched or (None, None)
+
+                response_data = await inference_engine.api_inference(
+                    model_name=model_name,
+                    message=message,
+                    temperature=temperature,
+                    # max_new_tokens=request.settings.max_new_tokens
+                    history=history,
+                    context=context,
+                    prepared=prepared
+                )
+            else:
+                response_data = await inference_engine.pytorch_inference(
+                    model_name=model_name,
+                    message=message,
+                    history=history,
+                    conversation_id=conversation_id
+                )
+
+            if conversation_id:
+                reply = response_text(response_data)
+                # Conversation memory picks the new turns up from the store on the next message
+                await asyncio.to_thread(save_turns, conversation_id, [("user", message), ("assistant", reply)])
+
+            if request.includeTimings:
+                response_data.metadata = {**(response_data.metadata or {}), "timings": trace.summary()}
             
             return response_data
 
-        # return ChatResponse(response=response_data)
+            # return ChatResponse(response=response_data)
 
+    except QueueFull as e:
+        print(f"Shedding chat request: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": "1"})
+    except DeadlineExceeded as e:
+        print(f"Deadline exceeded: {str(e)}")
+        raise HTTPException(status_code=504, detail=f"Timed out: {str(e)}")
     except requests.RequestException as e:
         print(f"Network error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        profiler.request_finished()
+
+
+@router.post("/chat/prefetch")
+async def prefetch(request: PrefetchRequest, http_request: Request):
+    """
+    Warm classification and retrieval for a draft message so a matching
+    /chat request can skip them. Speculative: may be skipped under load.
+    """
+    client_id = http_request.client.host if http_request.client else "anonymous"
+    # Web search per keystroke is too costly to leave to the client; it can only opt out
+    include_web = settings.PREFETCH_WEB and request.includeWeb is not False
+    with client_scope(client_id):
+        return prefetcher.schedule(request.message, prefetch_client_key(client_id, request.conversationId), include_web)
+
+
+@router.get("/chat/prefetch")
+async def prefetch_status():
+    return prefetcher.snapshot()
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    http_request: Request,
+    model_name: Optional[str] = None,
+    temperature: float = 0.7,
+    concurrency: Optional[int] = Query(None, ge=1)
+):
+    """
+    Run many messages through the chat pipeline, streaming NDJSON results as they complete.
+
+    The body is either a JSON BatchChatRequest, a JSON list of items, or JSONL
+    with one item per line; for the last two the model comes from the query.
+    Each result line has the item's index and id; the last line is a summary.
+    """
+    body = await http_request.body()
+    try:
+        batch = parse_batch(body, http_request.headers.get("content-type", ""), model_name, temperature)
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {e}")
+
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="Invalid batch: no items")
+    if len(batch.items) > batch_runner.max_items:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(batch.items)} items, the limit is {batch_runner.max_items}")
+
+    client_id = http_request.client.host if http_request.client else "anonymous"
+
+    async def lines():
+        results = batch_runner.run(
+            batch.items,
+            batch.settings,
+            concurrency or batch.concurrency or settings.BATCH_DEFAULT_CONCURRENCY,
+            client_id=f"batch:{client_id}"
+        )
+        async for result in results:
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/chat/queue")
+async def queue_status():
+    """Current scheduler load, queue times and shed counts."""
+    return scheduler.snapshot()
+
+
+def prefetch_client_key(client_id: str, conversation_id: Optional[str]) -> str:
+    """Drafts are only reused by the same client in the same conversation."""
+    return f"{client_id}:{conversation_id or ''}"
+
+
+def save_turns(conversation_id: str, turns: List[Tuple[str, str]]):
+    for role, content in turns:
+        if content:
+            chat_store.append_message(conversation_id, role, content)
+
+
+def parse_batch(body: bytes, content_type: str, model_name: Optional[str], temperature: float) -> BatchChatRequest:
+    if "json" in content_type and "jsonl" not in content_type and "ndjson" not in content_type:
+        data = json.loads(body)
+        if isinstance(data, dict):
+            return BatchChatRequest(**data)
+        items = [BatchItem(**item) for item in data]
+    else:
+        items = [BatchItem(**json.loads(line)) for line in body.decode("utf-8").splitlines() if line.strip()]
+
+    if not model_name:
+        raise ValueError("model_name is required unless the body includes settings")
+    chat_settings = ChatSettings(modelName=model_name, temperature=temperature, maxTokens=256, isTensorlinkConnected=False)
+    return BatchChatRequest(items=items, settings=chat_settings)
+
+
+def response_text(response_data: ChatResponse) -> str:
+    """Pull the generated text out of a chat response."""
+    response = response_data.response
+    if isinstance(response, dict):
+        return str(response.get("response", ""))
+    return str(response or "")
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from config.settings import settings
+from core.chat_store import chat_store
+from core.conversation_memory import conversation_memory
+from core.prefix_cache import prefix_cache
+from core.retriever import retriever
+from fastapi import APIRouter, HTTPException, Query
+from schema import ChatMessageCreate
+
+router = APIRouter(tags=["chats"])
+
+
+@router.get("/chats")
+async def list_chats(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """Stored chats, most recently updated first."""
+    return await asyncio.to_thread(chat_store.list_chats, limit, offset)
+
+
+@router.get("/chats/changes")
+async def chat_changes(since: int = Query(0, ge=0), limit: int = Query(1000, ge=1, le=10000)):
+    """Messages appended and chats deleted after sequence number since."""
+    return await asyncio.to_thread(chat_store.changes_since, since, limit)
+
+
+@router.get("/chats/search")
+async def search_chats(
+    q: str,
+    k: int = Query(5, ge=1, le=100),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    half_life_days: Optional[float] = Query(None, ge=0)
+):
+    """
+    Search chat history, optionally within a date range (ms timestamps or ISO
+    dates) and with recency decay. Only the time shards in range are searched.
+    """
+    start_ms, end_ms = parse_time(start), parse_time(end)
+    if half_life_days is None:
+        half_life_days = settings.RETRIEVAL_RECENCY_HALF_LIFE_DAYS
+
+    results = await asyncio.to_thread(retriever.search_relevant_history, q, k, start_ms, end_ms, half_life_days)
+    return {"results": results}
+
+
+@router.post("/chats/import")
+async def import_chats():
+    """Reconcile the store with the renderer's JSON chat files: new, edited and removed chats."""
+    return await asyncio.to_thread(chat_store.import_json_dir)
+
+
+@router.get("/chats/{chat_id}")
+async def get_chat(chat_id: str, after: int = Query(0, ge=0), limit: int = Query(None, ge=1)):
+    chat = await asyncio.to_thread(chat_store.get_chat, chat_id, after, limit)
+    if chat is None:
+        raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+    return chat
+
+
+@router.post("/chats/{chat_id}/messages")
+async def append_message(chat_id: str, message: ChatMessageCreate):
+    """Append a message, creating the chat if it doesn't exist."""
+    seq = await asyncio.to_thread(chat_store.append_message, chat_id, message.role, message.content, message.timestamp)
+    return {"chat_id": chat_id, "seq": seq}
+
+
+@router.delete("/chats/{chat_id}")
+async def delete_chat(chat_id: str):
+    if not await asyncio.to_thread(chat_store.delete_chat, chat_id):
+        raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+    conversation_memory.forget(chat_id)
+    prefix_cache.drop(chat_id)
+    return {"deleted": chat_id}
+
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """A query parameter given as ms since the epoch or an ISO date, in ms."""
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
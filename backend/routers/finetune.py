@@ -0,0 +1,48 @@
+import asyncio
+
+from core.finetune import finetune_jobs
+from core.model_manager import model_manager
+from fastapi import APIRouter, HTTPException
+from schema import FinetuneRequest
+
+router = APIRouter(tags=["finetune"])
+
+
+@router.post("/finetune")
+async def start_finetune(request: FinetuneRequest):
+    """Queue a LoRA fine-tuning job; poll /finetune/{job_id} for progress."""
+    chat_history = [{"role": item.role, "content": item.content, "feedback": item.feedback} for item in request.chatHistory]
+    try:
+        job = await asyncio.to_thread(finetune_jobs.submit, request.modelName, chat_history, request.includeChatStore)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"success": True, "message": f"Fine-tuning job {job['id']} queued", "job_id": job["id"]}
+
+
+@router.get("/finetune")
+async def list_finetune_jobs():
+    return {"jobs": await asyncio.to_thread(finetune_jobs.list)}
+
+
+@router.get("/finetune/adapters")
+async def list_adapters():
+    """Finished adapters, loadable as local models under their name."""
+    return {"adapters": await asyncio.to_thread(model_manager.adapters)}
+
+
+@router.get("/finetune/{job_id}")
+async def get_finetune_job(job_id: str):
+    """Job status with step, loss, tokens per second and ETA."""
+    job = await asyncio.to_thread(finetune_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Fine-tuning job {job_id} not found")
+    return {"success": True, "job": job}
+
+
+@router.delete("/finetune/{job_id}")
+async def cancel_finetune_job(job_id: str):
+    """Cancel a queued job, or have a running one checkpoint and stop."""
+    job = await asyncio.to_thread(finetune_jobs.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Fine-tuning job {job_id} not found")
+    return {"success": True, "job": job}
@@ -1,13 +1,15 @@
+import asyncio
 import json
 import os
 import time
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-import requests
-import torch
+from config.settings import settings
+from core.generation_metrics import generation_metrics
+from core.model_manager import LoadedModel, model_manager
+from core.network_stats import network_stats
+from core.prefix_cache import prefix_cache
 from fastapi import APIRouter, HTTPException
-from huggingface_hub import HfApi
-from transformers import AutoModelForCausalLM, AutoTokenizer
 
 https_serv = "https://smartnodes.ddns.net/tensorlink-api"
 http_serv = "http://smartnodes.ddns.net/tensorlink-api"
@@ -15,54 +17,117 @@ http_serv = "http://smartnodes.ddns.net/tensorlink-api"
 # Create router for model endpoints
 router = APIRouter(tags=["models"])
 
-# Model cache to avoid reloading
-model_cache = {}
-
 
 def load_model(model_name: str):
-    """Load a model from Hugging Face Hub."""
-    if model_name in model_cache:
-        return model_cache[model_name]
-    
+    """Load a model from Hugging Face Hub, reusing it if it's already in memory."""
+    try:
+        return model_manager.get(model_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading model: {e}")
+
+
+async def acquire_model_async(model_name: str) -> LoadedModel:
+    """
+    Lease a model, loading it in a worker thread so the event loop stays free.
+    Return the lease with model_manager.release() once done generating.
+    """
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(model_name).to("cuda" if torch.cuda.is_available() else "cpu")
-        model_cache[model_name] = (tokenizer, model)
-        return tokenizer, model
+        return await asyncio.to_thread(model_manager.acquire, model_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading model: {e}")
 
 
-def chat_with_model(_model, _tokenizer, question, max_length=256):
-    input_text = question + _tokenizer.eos_token
-    inputs = _tokenizer.encode(input_text, return_tensors="pt")
-    
-    # TODO: Concatenate chat history
+def chat_with_model(_model, _tokenizer, question, max_new_tokens=256, history=None, conversation_id=None, draft_model=None):
+    """
+    Generate a reply to question, continuing from the given history.
+
+    When a conversation_id is given, the KV cache left by the previous turn is
+    reused so only the tokens added since then are run through the model. A
+    draft_model sharing the tokenizer turns on assisted (speculative) generation.
+    """
+    import torch
+
+    history = history or []
+    input_text = "".join(item["content"] + _tokenizer.eos_token for item in history)
+    input_text += question + _tokenizer.eos_token
+    inputs = _tokenizer.encode(input_text, return_tensors="pt").to(_model.device)
+
+    generate_kwargs = {
+        "max_new_tokens": max_new_tokens,
+        "num_return_sequences": 1,
+        "temperature": 0.7,
+        "pad_token_id": _tokenizer.eos_token_id
+    }
+
+    if draft_model is not None:
+        draft_model.generation_config.num_assistant_tokens = settings.DRAFT_NUM_TOKENS
+        generate_kwargs["assistant_model"] = draft_model
+
+    model_name = _model.name_or_path
+    with torch.no_grad(), generation_metrics.track(model_name, _model, draft_model) as run:
+        if conversation_id:
+            outputs, _ = prefix_cache.generate(_model, inputs, conversation_id, model_name, **generate_kwargs)
+        else:
+            outputs = _model.generate(inputs, **generate_kwargs)
+        run["new_tokens"] = outputs.shape[1] - inputs.shape[1]
 
-    with torch.no_grad():
-        outputs = _model.generate(
-            inputs,
-            max_length=max_length,
-            num_return_sequences=1,
-            temperature=0.7,
-            pad_token_id=_tokenizer.eos_token_id
-        )
+    return _tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
 
-    return _tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+def acquire_draft_model(model_name: str, tokenizer) -> Optional[LoadedModel]:
+    """
+    Lease the draft model configured for model_name, or None if there isn't
+    a usable one. Return the lease with model_manager.release().
+    """
+    draft_name = settings.DRAFT_MODELS.get(model_name)
+    if not draft_name:
+        return None
+
+    try:
+        draft = model_manager.acquire(draft_name)
+    except Exception as e:
+        print(f"Error loading draft model {draft_name}: {e}")
+        return None
+
+    if len(draft.tokenizer) != len(tokenizer):
+        print(f"Draft model {draft_name} doesn't share a vocabulary with {model_name}, skipping it")
+        model_manager.release(draft)
+        return None
+
+    return draft
 
 
 # Router endpoint for getting available models
 @router.get("/models")
 async def get_models():
-    """Return available models based on Tensorlink connection status."""
-    response = requests.get(f"{https_serv}/stats")
-    models = [
-        {"id": "Qwen/Qwen2.5-7B-Instruct", "name": "Qwen2.5-7B", "requires_tensorlink": True},
-        {"id": "Qwen/Qwen3-8B-Instruct", "name": "Qwen3-8B", "requires_tensorlink": True},
+    """Return available models, derived from the cached Tensorlink network stats, and local fine-tuned adapters."""
+    adapters = [
+        {"id": name, "name": name.split("/")[-1], "requires_tensorlink": False}
+        for name in model_manager.adapters()
     ]
+    return network_stats.models() + adapters
+
+
+@router.get("/models/loaded")
+async def get_loaded_models():
+    """Return models currently held in memory with their footprint and last use."""
+    return {
+        "models": model_manager.list_loaded(),
+        "memory_mb": round(model_manager.memory_usage() / (1024 ** 2), 1),
+        "budget_mb": round(model_manager.memory_budget / (1024 ** 2), 1),
+        "prefix_cache": prefix_cache.usage()
+    }
+
+
+@router.get("/models/metrics")
+async def get_generation_metrics():
+    """Return local generation throughput and speculative decoding acceptance per model."""
+    return generation_metrics.summary()
 
-    # if response:
-    #     models = response.get("models")
 
-    return models
-    
\ No newline at end of file
+@router.delete("/models/loaded/{model_name:path}")
+async def unload_model(model_name: str):
+    """Free a loaded model's weights."""
+    if not model_manager.unload(model_name):
+        raise HTTPException(status_code=404, detail=f"Model not loaded: {model_name}")
+    return {"success": True, "message": f"Unloaded {model_name}"}
@@ -1,3 +1,4 @@
+from core.request_policy import hedged_requester
 from core.tensorlink_manager import tensorlink_manager
 from fastapi import APIRouter, HTTPException
 
@@ -11,3 +12,12 @@ async def connect():
 @router.get("/disconnect")
 async def disconnect():
     return await tensorlink_manager.disconnect()
+
+@router.get("/latency")
+async def latency():
+    """Observed Tensorlink latency percentiles per server and hedging counters."""
+    return {
+        "servers": hedged_requester.tracker.summary(),
+        "hedge_delay": {kind: hedged_requester.hedge_delay(kind) for kind in ("generation", "classification", "summary")},
+        "stats": hedged_requester.stats
+    }
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel
 
@@ -7,6 +7,7 @@ from pydantic import BaseModel
 class HistoryItem(BaseModel):
     role: str
     content: str
+    feedback: Optional[str] = None
 
 
 class ChatSettings(BaseModel):
@@ -19,15 +20,45 @@ class ChatSettings(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     settings: ChatSettings
+    conversationId: Optional[str] = None
+    includeTimings: bool = False
+
+
+class PrefetchRequest(BaseModel):
+    message: str
+    conversationId: Optional[str] = None
+    includeWeb: Optional[bool] = None
+
+
+class BatchItem(BaseModel):
+    id: Optional[Union[str, int]] = None
+    message: str
+    history: Optional[List[HistoryItem]] = None
+
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchItem]
+    settings: ChatSettings
+    concurrency: Optional[int] = None
 
 
 class ChatResponse(BaseModel):
     response: Any
+    metadata: Optional[Dict[str, Any]] = None
+
+
+class ChatMessageCreate(BaseModel):
+    role: str
+    content: str
+    # Milliseconds since the epoch or an ISO string; defaults to now
+    timestamp: Optional[Union[int, float, str]] = None
 
 
 class FinetuneRequest(BaseModel):
     modelName: str
-    chatHistory: List[str]
+    # The renderer sends its message objects; replies with negative feedback aren't trained on
+    chatHistory: List[HistoryItem] = []
+    includeChatStore: bool = True
 
 
 class InferenceMode(str, Enum):
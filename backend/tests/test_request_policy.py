@@ -0,0 +1,114 @@
+"""
+HedgedRequester against local stand-in Tensorlink servers with injected delays.
+
+    cd backend && python -m pytest tests
+"""
+import asyncio
+import time
+
+import pytest
+from benchmarks.stand_ins import FakeTensorlinkServer
+from core.request_policy import DeadlineExceeded, HedgedRequester, deadline_scope, endpoint_key
+
+PAYLOAD = {"message": "hello", "max_new_tokens": 8}
+
+
+async def timed_post(requester, path, payload, **kwargs):
+    """Time the call itself; asyncio.run also waits for abandoned worker threads on exit."""
+    start = time.monotonic()
+    try:
+        return await requester.post(path, payload, **kwargs)
+    finally:
+        requester.elapsed = time.monotonic() - start
+
+
+class RecordingRequester(HedgedRequester):
+    """Notes which servers' attempts were cancelled, and when each was launched."""
+    def __init__(self, servers, hedge_delay: float, **kwargs):
+        super().__init__(servers=servers, **kwargs)
+        self._hedge_delay = hedge_delay
+        self.launched = {}
+        self.cancelled = []
+
+    def hedge_delay(self, kind: str = "generation") -> float:
+        return self._hedge_delay
+
+    async def _attempt(self, server, path, payload, timeout, kind):
+        self.launched[server] = time.monotonic()
+        try:
+            return await super()._attempt(server, path, payload, timeout, kind)
+        except asyncio.CancelledError:
+            self.cancelled.append(server)
+            raise
+
+
+def test_hedge_fires_after_threshold_and_fast_server_wins():
+    with FakeTensorlinkServer(latency=2.0) as slow, FakeTensorlinkServer(latency=0.05) as fast:
+        requester = RecordingRequester([slow.url, fast.url], hedge_delay=0.3)
+
+        response = asyncio.run(timed_post(requester, "/generate", PAYLOAD, timeout=5))
+
+    assert response.status_code == 200
+    assert requester.launched[fast.url] - requester.launched[slow.url] >= 0.3
+    assert requester.elapsed < 1.0
+    assert requester.stats["hedges"] == 1
+    assert requester.stats["hedge_wins"] == 1
+    assert fast.requests == 1
+
+
+def test_no_hedge_when_primary_answers_in_time():
+    with FakeTensorlinkServer(latency=0.05) as primary, FakeTensorlinkServer() as backup:
+        requester = RecordingRequester([primary.url, backup.url], hedge_delay=1.0)
+        response = asyncio.run(requester.post("/generate", PAYLOAD, timeout=5))
+
+    assert response.status_code == 200
+    assert requester.stats["hedges"] == 0
+    assert backup.requests == 0
+
+
+def test_deadline_scope_raises_deadline_exceeded():
+    async def call(requester):
+        with deadline_scope(0.3):
+            return await timed_post(requester, "/generate", PAYLOAD, timeout=5)
+
+    with FakeTensorlinkServer(latency=1.5) as slow, FakeTensorlinkServer(latency=1.5) as slower:
+        requester = RecordingRequester([slow.url, slower.url], hedge_delay=0.1)
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(call(requester))
+
+    assert requester.elapsed < 1.0
+    assert requester.stats["deadline_exceeded"] == 1
+    assert sorted(requester.cancelled) == sorted([slow.url, slower.url])
+
+
+def test_exhausted_deadline_fails_before_calling_out():
+    async def call(requester):
+        with deadline_scope(0):
+            return await requester.post("/generate", PAYLOAD)
+
+    with FakeTensorlinkServer() as server:
+        requester = RecordingRequester([server.url], hedge_delay=1.0)
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(call(requester))
+
+    assert server.requests == 0
+
+
+def test_losing_attempt_is_cancelled():
+    with FakeTensorlinkServer(latency=2.0) as slow, FakeTensorlinkServer(latency=0.05) as fast:
+        requester = RecordingRequester([slow.url, fast.url], hedge_delay=0.2)
+        asyncio.run(requester.post("/generate", PAYLOAD, timeout=5))
+
+    assert requester.cancelled == [slow.url]
+
+
+def test_latency_tracked_per_kind_including_abandoned_attempts():
+    with FakeTensorlinkServer(latency=1.0) as slow, FakeTensorlinkServer(latency=0.05) as fast:
+        requester = RecordingRequester([slow.url, fast.url], hedge_delay=0.2)
+        asyncio.run(requester.post("/generate", PAYLOAD, timeout=5, kind="classification"))
+
+    summary = requester.tracker.summary()
+    assert set(summary) == {endpoint_key(slow.url, "classification"), endpoint_key(fast.url, "classification")}
+    # The abandoned primary's time counts, so the tail it was cut off at isn't lost
+    assert summary[endpoint_key(slow.url, "classification")]["p50"] >= 0.2
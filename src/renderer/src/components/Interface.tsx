@@ -57,7 +57,8 @@ export const Interface = () => {
     const result = await sendMessage(
       inputMessage,
       chatSettings,
-      addMessage // useMessages.addMessage will handle saving automatically
+      addMessage, // useMessages.addMessage will handle saving automatically
+      selectedChat.title
     )
 
     if (result?.success) {
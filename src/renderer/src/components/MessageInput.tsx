@@ -1,4 +1,9 @@
 import React, { useEffect, useRef } from 'react'
+import { ApiService } from '../services/api'
+
+// Wait for a pause in typing before asking the backend to prepare the draft
+const PREFETCH_DEBOUNCE_MS = 400
+const PREFETCH_MIN_CHARS = 12
 
 interface MessageInputProps {
   inputMessage: string
@@ -32,6 +37,17 @@ export const MessageInput: React.FC<MessageInputProps> = ({
     }
   }, [inputMessage])
 
+  useEffect(() => {
+    const draft = inputMessage.trim()
+    if (disabled || !selectedChat || draft.length < PREFETCH_MIN_CHARS) {
+      return
+    }
+    const timer = setTimeout(() => {
+      ApiService.prefetchDraft(draft, selectedChat.title)
+    }, PREFETCH_DEBOUNCE_MS)
+    return () => clearTimeout(timer)
+  }, [inputMessage, disabled, selectedChat])
+
   const handleKeyDown = (e: React.KeyboardEvent) => {
     if (e.key === 'Enter' && !e.shiftKey) {
       e.preventDefault()
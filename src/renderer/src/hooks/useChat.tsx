@@ -9,7 +9,8 @@ export const useChat = () => {
   const sendMessage = async (
     messageContent: string,
     settings: ChatSettings,
-    onMessageAdd: (message: Message) => void
+    onMessageAdd: (message: Message) => void,
+    conversationId?: string
   ) => {
     if (!messageContent.trim() || isSending) return
 
@@ -25,7 +26,11 @@ export const useChat = () => {
     setIsLoading(true)
 
     try {
-      const response = await ApiService.sendChatMessage(userMessage.content, settings)
+      const response = await ApiService.sendChatMessage(
+        userMessage.content,
+        settings,
+        conversationId
+      )
 
       const responseText =
         typeof response.response === 'string'
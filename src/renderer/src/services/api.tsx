@@ -71,7 +71,8 @@ export class ApiService {
 
   static async sendChatMessage(
     message: string,
-    settings: ChatSettings
+    settings: ChatSettings,
+    conversationId?: string
   ): Promise<{ response: string }> {
     try {
       const response = await fetch(`${API_URL}/chat`, {
@@ -80,7 +81,7 @@ export class ApiService {
           'Content-Type': 'application/json',
           Accept: 'application/json'
         },
-        body: JSON.stringify({ message, settings })
+        body: JSON.stringify({ message, settings, conversationId })
       })
 
       // Log response details for debugging
@@ -101,6 +102,35 @@ export class ApiService {
     }
   }
 
+  // Speculative: lets the backend prepare context while the user is still typing.
+  // Failures don't matter, the chat request works without it
+  static async prefetchDraft(message: string, conversationId?: string): Promise<void> {
+    try {
+      await fetch(`${API_URL}/chat/prefetch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ message, conversationId })
+      })
+    } catch (error) {
+      console.debug('Draft prefetch failed:', error)
+    }
+  }
+
+  // Drops the chat from the backend's store and index. The chat file is already
+  // gone, so a failure only leaves the backend to catch up on its next import
+  static async deleteChat(conversationId: string): Promise<void> {
+    try {
+      const response = await fetch(`${API_URL}/chats/${encodeURIComponent(conversationId)}`, {
+        method: 'DELETE'
+      })
+      if (!response.ok && response.status !== 404) {
+        throw new Error(`Failed to delete chat: ${response.status}`)
+      }
+    } catch (error) {
+      console.error('Error deleting chat from the backend:', error)
+    }
+  }
+
   static async initiateFinetuning(
     modelName: string,
     messages: Message[]
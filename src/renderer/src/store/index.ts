@@ -1,3 +1,4 @@
+import { ApiService } from '@renderer/services/api'
 import { ChatContent, ChatInfo } from '@shared/models'
 import { atom } from 'jotai'
 import { unwrap } from 'jotai/utils'
@@ -96,6 +97,8 @@ export const deleteChatAtom = atom(null, async (get, set) => {
 
   if (!isDeleted) return
 
+  await ApiService.deleteChat(selectedChat.title)
+
   // filter out the deleted chat
   set(
     chatsAtom,
@@ -20,8 +20,17 @@ export interface Model {
 }
 
 export interface FineTuningJob {
+  id: string
   model: string
-  status: 'processing' | 'completed' | 'failed'
+  adapter_name: string
+  status: 'queued' | 'running' | 'cancelling' | 'completed' | 'failed' | 'cancelled'
+  // Percent complete
   progress: number
   created_at: number
+  step: number
+  total_steps: number | null
+  tokens_per_second: number | null
+  eta_seconds: number | null
+  loss: number | null
+  error: string | null
 }